@@ -0,0 +1,37 @@
+import re
+
+ansi_escape = re.compile(rb'\x1B\[[0-9;]*[A-Za-z]')
+# An escape sequence that has started but not finished at the end of a chunk
+_partial_escape = re.compile(rb'\x1B(?:\[[0-9;]*)?$')
+# Longest unfinished sequence held back before giving up and passing it through as text
+MAX_PENDING = 64
+
+
+class AnsiStripper:
+    """
+    Removes ANSI CSI sequences (the same ones `ansi_escape` matches) from a byte stream fed in arbitrary chunks.
+    Only new bytes are scanned. A sequence split across chunks is held back until its final letter arrives.
+    """
+    def __init__(self) -> None:
+        self._pending = b''
+
+    def feed(self, data: bytes) -> bytes:
+        if self._pending:
+            data = self._pending + data
+            self._pending = b''
+        elif b'\x1b' not in data:
+            return data
+
+        # Look for the unfinished sequence in the raw bytes: removing a sequence must not glue its neighbours into a new one
+        tail = data.rfind(b'\x1b')
+        if tail != -1 and len(data) - tail <= MAX_PENDING and _partial_escape.match(data, tail):
+            self._pending = data[tail:]
+            data = data[:tail]
+        return ansi_escape.sub(b'', data)
+
+    def flush(self) -> bytes:
+        """
+        Return whatever is held back, e.g. when the stream ends.
+        """
+        pending, self._pending = self._pending, b''
+        return pending
@@ -0,0 +1,190 @@
+"""
+asyncio version of SerialConsole: every console is a pair of pipe transports on one non-blocking tty file descriptor,
+so a single event loop thread can drive dozens of controllers. POSIX only (ttys, ptys).
+
+    python async_serial_console.py /dev/ttyUSB0 /dev/ttyUSB1 ... --action restart
+"""
+from __future__ import annotations
+from ansi_stream import AnsiStripper
+from expect import Script, ScriptError, ScriptResult, ScriptRun, login_script, restart_bnserver_script
+from typing import Any, Callable, Coroutine, Dict, List
+import argparse
+import asyncio
+import os
+import termios
+import time
+import tty
+
+
+class _ConsoleProtocol(asyncio.Protocol):
+    def __init__(self, console: AsyncSerialConsole) -> None:
+        self._console = console
+
+    def data_received(self, data: bytes) -> None:
+        self._console._data_received(data)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._console._connection_lost(exc)
+
+
+class AsyncSerialConsole:
+    def __init__(self) -> None:
+        """
+        Use open() for a serial port or from_fd() for an already open tty, e.g. the slave side of a pty.
+        """
+        self.buffer = bytearray()
+        self._stripper = AnsiStripper()
+        self._data_event = asyncio.Event()
+        self._error: Exception | None = None
+        self._reader: asyncio.ReadTransport | None = None
+        self._writer: asyncio.WriteTransport | None = None
+        self.name = ""
+
+    @classmethod
+    async def open(cls, port: str, baudrate: int = 115200) -> AsyncSerialConsole:
+        fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(fd)
+            attributes = termios.tcgetattr(fd)
+            speed = getattr(termios, f"B{baudrate}")
+            attributes[4] = attributes[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attributes)
+        except Exception:
+            os.close(fd)
+            raise
+        return await cls.from_fd(fd, name=port)
+
+    @classmethod
+    async def from_fd(cls, fd: int, name: str = "") -> AsyncSerialConsole:
+        """
+        Take ownership of `fd`. It is closed by close().
+        """
+        console = cls()
+        console.name = name or f"fd {fd}"
+        os.set_blocking(fd, False)
+        loop = asyncio.get_running_loop()
+        # The transports each close their own file object, so the writer gets a duplicate descriptor
+        console._reader, _ = await loop.connect_read_pipe(lambda: _ConsoleProtocol(console), os.fdopen(fd, "rb", buffering=0))
+        console._writer, _ = await loop.connect_write_pipe(asyncio.Protocol, os.fdopen(os.dup(fd), "wb", buffering=0))
+        return console
+
+    def _data_received(self, data: bytes) -> None:
+        self.buffer.extend(self._stripper.feed(data))
+        self._data_event.set()
+
+    def _connection_lost(self, exc: Exception | None) -> None:
+        self._error = exc or ConnectionError("Console closed")
+        self._data_event.set()
+
+    async def read_until_prompt(self, prompt: str = '#', timeout: float = 60, verbose: bool = False) -> str:
+        """
+        Same contract as SerialConsole.read_until_prompt: return everything up to and including `prompt`
+        and leave the rest buffered.
+        """
+        prompt_bytes = prompt.encode()
+        deadline = time.monotonic() + timeout
+        search_from = 0
+        while True:
+            index = self.buffer.find(prompt_bytes, search_from)
+            if index != -1:
+                end = index + len(prompt_bytes)
+                output = bytes(self.buffer[:end]).decode("ascii", errors="ignore")
+                del self.buffer[:end]
+                if verbose:
+                    print(f"[{self.name}] {output}")
+                return output
+            search_from = max(0, len(self.buffer) - len(prompt_bytes) + 1)
+            if self._error is not None:
+                raise RuntimeError(f"{self.name} failed while waiting for {prompt}: {self._error}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"Wait {prompt} command timeout")
+            self._data_event.clear()
+            try:
+                await asyncio.wait_for(self._data_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def send(self, command: str) -> None:
+        if self._writer is None or self._writer.is_closing():
+            raise RuntimeError(f"{self.name} is closed")
+        self._writer.write((command + '\n').encode())
+
+    async def close(self) -> None:
+        for transport in (self._reader, self._writer):
+            if transport is not None:
+                transport.close()
+        # Let the transports run their close callbacks
+        await asyncio.sleep(0)
+
+    async def run_script(self, script: Script, variables: Dict[str, str] | None = None) -> ScriptResult:
+        """
+        ExpectSession.run on the event loop: the same scripts, step names and ScriptError.
+        """
+        run = ScriptRun(script, variables)
+        while True:
+            expect = run.next_expect(self.send)
+            if expect is None:
+                return run.result
+            try:
+                output = await self.read_until_prompt(expect.pattern, expect.timeout)
+            except Exception as e:
+                raise run.error(e) from e
+            run.matched(output)
+
+    # ---- shell helpers, same scripts as iom_clear_script ----
+
+    async def wait_for_shell_prompt(self, current_dir: str) -> None:
+        self.send('')
+        await self.read_until_prompt(f"{current_dir}#", timeout=3)
+
+    async def wait_for_bootup(self) -> None:
+        await self.read_until_prompt('Controller Service is running')
+        print(f'[{self.name}] Controller online')
+
+    async def login(self) -> ScriptResult:
+        result = await self.run_script(login_script())
+        print(f"[{self.name}] Logged in!")
+        return result
+
+    async def restart_bnserver(self) -> ScriptResult:
+        """
+        :return: how long each step of restart_bnserver_script() took
+        """
+        try:
+            return await self.run_script(restart_bnserver_script())
+        except ScriptError as e:
+            raise RuntimeError(f"Failed to restart bnserver with exception: {e}") from e
+
+
+async def run_on_all(ports: List[str], action: Callable[[AsyncSerialConsole], Coroutine[Any, Any, Any]], baudrate: int = 115200) -> List[Any]:
+    """
+    Open every port and run `action` on all of them at once. A failure on one port does not stop the others;
+    its exception is returned in that port's place.
+    """
+    async def run_one(port: str) -> Any:
+        console = await AsyncSerialConsole.open(port, baudrate)
+        try:
+            return await action(console)
+        finally:
+            await console.close()
+    return await asyncio.gather(*(run_one(port) for port in ports), return_exceptions=True)
+
+
+ACTIONS = {
+    "login": AsyncSerialConsole.login,
+    "restart": AsyncSerialConsole.restart_bnserver,
+    "bootup": AsyncSerialConsole.wait_for_bootup,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ports", nargs="+")
+    parser.add_argument("--action", choices=sorted(ACTIONS), default="login")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_on_all(args.ports, ACTIONS[args.action], args.baudrate))
+    for port, result in zip(args.ports, results):
+        print(f"{port}: {'FAILED ' + str(result) if isinstance(result, Exception) else 'ok'}")
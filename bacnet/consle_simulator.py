@@ -1,33 +1,100 @@
-from pyDAQ.UniversalIO import UniversalIO
-from pyDAQ.UART import DAQ_UART
+"""
+Interactive console for a controller's serial port.
+
+The port and stdin are watched with one selector, so output is printed as soon as it arrives (not when a '#' shows
+up) and the process sleeps in select() while the line is quiet. Escape codes are stripped as the bytes stream in.
+
+By default input goes out a line at a time. With --raw every keystroke is sent as typed (Tab completion, arrow keys,
+Ctrl+C to the controller's shell); Ctrl+] quits. POSIX only: Windows can not select() on a COM port.
+
+    python consle_simulator.py /dev/ttyUSB0 --baudrate 921600 --raw
+"""
+from ansi_stream import AnsiStripper
+import argparse
+import os
+import selectors
 import serial
-import threading
-import re
-
-ansi_escape = re.compile(rb'\x1B\[[0-9;]*[A-Za-z]') 
-
-def clean_response(data: bytes) -> bytes:
-    return ansi_escape.sub(b'', data)
-
-debug_uart = serial.Serial("COM38", baudrate=115200, timeout=2)
-# daq = UniversalIO()
-# debug_uart = DAQ_UART(daq, "EXP4", baudrate=115200, timeout=60)
-
-def read_from_port(ser:serial.Serial) -> None:
-    while True:
-        response = ser.read_until(b'#')
-        response = clean_response(response)
-        if response:
-            print(response.decode('ascii', errors='ignore'), end='')
-
-thread = threading.Thread(target=read_from_port, args=(debug_uart,), daemon=True)
-thread.start()
-
-print("Serial Console Started. Type your commands below:")
-try:
-    while True:
-        command = input()
-        debug_uart.write((command + '\n').encode()) 
-except KeyboardInterrupt:
-    print("\nExiting console.")
-    debug_uart.close() 
+import sys
+import termios
+import tty
+
+QUIT_KEY = b'\x1d'  # Ctrl+]
+# After stdin closes (e.g. piped commands), keep printing until the controller has been quiet this long
+LINGER = 0.5
+
+
+def write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def run_console(ser: serial.Serial, raw: bool = False, strip_ansi: bool = True) -> None:
+    stdin_fd = sys.stdin.fileno()
+    stdout_fd = sys.stdout.fileno()
+    port_fd = ser.fileno()
+    stripper = AnsiStripper() if strip_ansi else None
+
+    selector = selectors.DefaultSelector()
+    selector.register(port_fd, selectors.EVENT_READ)
+    selector.register(stdin_fd, selectors.EVENT_READ)
+    stdin_open = True
+
+    saved_mode = None
+    if raw and os.isatty(stdin_fd):
+        saved_mode = termios.tcgetattr(stdin_fd)
+        tty.setraw(stdin_fd)
+    try:
+        while True:
+            events = selector.select(None if stdin_open else LINGER)
+            if not events:
+                break
+            for key, _ in events:
+                if key.fd == port_fd:
+                    data = os.read(port_fd, 65536)
+                    if not data:
+                        return
+                    if stripper:
+                        data = stripper.feed(data)
+                    write_all(stdout_fd, data)
+                    continue
+
+                data = os.read(stdin_fd, 1024)
+                if not data:
+                    selector.unregister(stdin_fd)
+                    stdin_open = False
+                    continue
+                if raw:
+                    if QUIT_KEY in data:
+                        data = data[:data.index(QUIT_KEY)]
+                        ser.write(data.replace(b'\r', b'\n'))
+                        return
+                    # Enter arrives as '\r' in raw mode; the scripts end commands with '\n'
+                    data = data.replace(b'\r', b'\n')
+                ser.write(data)
+    finally:
+        if saved_mode is not None:
+            termios.tcsetattr(stdin_fd, termios.TCSADRAIN, saved_mode)
+        if stripper:
+            write_all(stdout_fd, stripper.flush())
+        selector.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("port", help="serial device, e.g. /dev/ttyUSB0 or the pty printed by controller_simulator.py")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--raw", action="store_true", help="send keystrokes as typed; Ctrl+] quits")
+    parser.add_argument("--color", action="store_true", help="pass escape codes through instead of stripping them")
+    args = parser.parse_args()
+
+    # timeout=0: reads are driven by the selector and never block
+    debug_uart = serial.Serial(args.port, baudrate=args.baudrate, timeout=0)
+    print("Serial Console Started. " + ("Ctrl+] to exit." if args.raw else "Type your commands below:"))
+    try:
+        run_console(debug_uart, raw=args.raw, strip_ansi=not args.color)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("\nExiting console.")
+        debug_uart.close()
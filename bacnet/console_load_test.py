@@ -0,0 +1,124 @@
+"""
+Throughput and prompt-latency benchmark for SerialConsole and CPUConsole against simulated controllers on ptys.
+
+Each console logs in, then sends short commands back to back and waits for the prompt after each one.
+Latency is measured from send() to read_until_prompt() returning. Logging in and restarting run the expect scripts
+that iom_clear_script.py and daq_iom_clear_script.py use. CPUConsole is driven through PtyUart, which gives a pyserial
+port the read_untils/write/close interface of pyDAQ's DAQ_UART.
+
+    python console_load_test.py --consoles 4 --commands 500 --response-delay 0.001
+    python console_load_test.py --kind serial --baudrate 115200 --restart
+"""
+from __future__ import annotations
+from ansi_stream import ansi_escape
+from concurrent.futures import ThreadPoolExecutor
+from controller_simulator import ControllerSimulator
+from daq_iom_clear_script import CPUConsole
+from expect import DaqUartStream, ExpectSession, IByteStream, login_script, restart_bnserver_script
+from iom_clear_script import SerialConsole, SerialConsoleStream
+from typing import Any, Dict, List, Tuple
+import argparse
+import serial
+import time
+
+
+class PtyUart:
+    """
+    DAQ_UART stand-in over a pyserial port: read_untils returns once the terminator has arrived, or on timeout.
+    The prompt's color codes sit in the raw bytes, so the terminator is looked for with them stripped.
+    """
+    def __init__(self, port: str, baudrate: int = 115200) -> None:
+        self._ser = serial.Serial(port, baudrate, timeout=1)
+
+    def read_untils(self, terminator: str, timeout: float = 1) -> bytes:
+        wanted = terminator.encode()
+        data = bytearray()
+        deadline = time.monotonic() + timeout
+        while wanted not in ansi_escape.sub(b'', data):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._ser.timeout = remaining
+            # Stop at every occurrence of the terminator's last character to check again
+            data += self._ser.read_until(wanted[-1:] or b'\n')
+        return bytes(data)
+
+    def write(self, data: bytes) -> None:
+        self._ser.write(data)
+
+    def close(self) -> None:
+        self._ser.close()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def open_console(kind: str, simulator: ControllerSimulator) -> Tuple[Any, IByteStream]:
+    """
+    :return: the console, and a stream over the same connection for the expect scripts
+    """
+    if kind == "serial":
+        console = SerialConsole(simulator.port)
+        return console, SerialConsoleStream(console)
+    uart = PtyUart(simulator.port)
+    return CPUConsole(uart), DaqUartStream(uart)
+
+
+def drive(kind: str, simulator: ControllerSimulator, commands: int, with_restart: bool) -> Dict[str, Any]:
+    console, stream = open_console(kind, simulator)
+    try:
+        session = ExpectSession(stream)
+        session.run(login_script())
+        latencies = []
+        start = time.perf_counter()
+        for i in range(commands):
+            sent = time.perf_counter()
+            console.send(f"echo {i}")
+            console.read_until_prompt("~#", timeout=5)
+            latencies.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - start
+        restart_seconds = session.run(restart_bnserver_script()).seconds if with_restart else None
+        return {"latencies": latencies, "elapsed": elapsed, "restart": restart_seconds}
+    finally:
+        console.close()
+
+
+def run(kind: str, consoles: int, commands: int, with_restart: bool, **simulator_options: Any) -> None:
+    simulators = [ControllerSimulator(**simulator_options) for _ in range(consoles)]
+    try:
+        with ThreadPoolExecutor(max_workers=consoles) as executor:
+            wall_start = time.perf_counter()
+            results = list(executor.map(lambda simulator: drive(kind, simulator, commands, with_restart), simulators))
+            wall = time.perf_counter() - wall_start
+    finally:
+        for simulator in simulators:
+            simulator.close()
+
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    total_commands = len(latencies)
+    print(f"{kind:<7} {consoles:3d} consoles  {total_commands / max(result['elapsed'] for result in results):9.1f} commands/s   "
+          f"latency p50 {percentile(latencies, 0.50) * 1000:7.2f} ms  p95 {percentile(latencies, 0.95) * 1000:7.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.2f} ms  max {latencies[-1] * 1000:7.2f} ms   wall {wall:.2f} s")
+    if with_restart:
+        restarts = sorted(result["restart"] for result in results)
+        print(f"{'':<7} restart_bnserver p50 {percentile(restarts, 0.50):.2f} s  max {restarts[-1]:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=["serial", "cpu", "both"], default="both")
+    parser.add_argument("--consoles", type=int, default=1, help="simulated controllers driven at the same time")
+    parser.add_argument("--commands", type=int, default=200, help="commands per console")
+    parser.add_argument("--response-delay", type=float, default=0.0, help="simulated seconds before each command's output")
+    parser.add_argument("--baudrate", type=int, default=None, help="throttle simulated output to this line rate")
+    parser.add_argument("--boot-delay", type=float, default=0.5, help="simulated ./start.sh duration")
+    parser.add_argument("--restart", action="store_true", help="also time restart_bnserver")
+    args = parser.parse_args()
+
+    for kind in (["serial", "cpu"] if args.kind == "both" else [args.kind]):
+        run(kind, args.consoles, args.commands, args.restart,
+            response_delay=args.response_delay, baudrate=args.baudrate, boot_delay=args.boot_delay)
@@ -0,0 +1,210 @@
+"""
+Simulated controller shell on a Linux pty, for running the console scripts without a controller on COM38.
+
+It echoes input, prints ANSI-colored prompts, and implements what the scripts use: the login flow, cd, ps, kill,
+rc-service bnserver, ./start.sh with its boot banners, and echo. Responses can be delayed and throttled to a baud rate.
+
+    python controller_simulator.py --response-delay 0.005 --baudrate 115200
+"""
+from __future__ import annotations
+import argparse
+import os
+import selectors
+import threading
+import time
+import tty
+
+GREEN = "\x1b[1;32m"
+BLUE = "\x1b[1;34m"
+RESET = "\x1b[0m"
+
+BOOT_BANNER = [
+    "OpenRC 0.44 is starting up Linux",
+    " * Mounting /proc ... [ ok ]",
+    " * Starting bnserver ... [ ok ]",
+    "Controller Service is running",
+]
+START_BANNER = [
+    "ControllerStartup: Loading configuration",
+    "ControllerStartup: Starting BACnet stack",
+    "ControllerStartup: Starting UltraCap Monitoring",
+]
+
+
+class ControllerSimulator:
+    def __init__(self, hostname: str = "DCI-CPU", password: str = "b%9P$MdeQP][", logged_in: bool = False,
+                 response_delay: float = 0.0, boot_delay: float = 1.0, baudrate: int | None = None) -> None:
+        """
+        :param response_delay: seconds before each command's output
+        :param boot_delay: seconds ./start.sh takes before its banner
+        :param baudrate: throttle output to this line rate; None for as fast as the pty goes
+        """
+        self.hostname = hostname
+        self.password = password
+        self.response_delay = response_delay
+        self.boot_delay = boot_delay
+        self.baudrate = baudrate
+        self.cwd = "~"
+        self.state = "shell" if logged_in else "login"
+        self.processes: dict[int, str] = {}
+        self._next_pid = 1200
+        self._start_processes()
+        self.commands = 0
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._input = bytearray()
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name=f"simulator {self.port}", daemon=True)
+        self._thread.start()
+
+    def _start_processes(self) -> None:
+        for command in ("./controller -service", "./bnserver -service"):
+            self._next_pid += 1
+            self.processes[self._next_pid] = command
+
+    # ---- output ----
+
+    def _write(self, text: str) -> None:
+        data = text.encode()
+        if self.baudrate:
+            # 10 bits per byte on an 8N1 line, sent in small bursts like a UART FIFO
+            for start in range(0, len(data), 16):
+                chunk = data[start:start + 16]
+                self._write_all(chunk)
+                time.sleep(len(chunk) * 10 / self.baudrate)
+        else:
+            self._write_all(data)
+
+    def _write_all(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._master, view)
+            except BlockingIOError:
+                time.sleep(0.001)
+                continue
+            view = view[written:]
+
+    def prompt_text(self) -> str:
+        return f"{GREEN}root@{self.hostname}{RESET}:{BLUE}{self.cwd}{RESET}# "
+
+    def boot(self) -> None:
+        """
+        Print the power-on banners and the login prompt, as wait_for_bootup expects after a power cycle.
+        """
+        self.state = "login"
+        self.cwd = "~"
+        for line in BOOT_BANNER:
+            self._write(line + "\r\n")
+        self._write(f"\r\n{self.hostname} login: ")
+
+    # ---- input ----
+
+    def _serve(self) -> None:
+        selector = selectors.DefaultSelector()
+        selector.register(self._master, selectors.EVENT_READ)
+        while self._running:
+            if not selector.select(timeout=0.2):
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+            # A terminal echoes what is typed right away, except passwords
+            if self.state != "password":
+                self._write(data.replace(b"\n", b"\r\n").decode(errors="ignore"))
+            self._input.extend(data)
+            while self._running and b"\n" in self._input:
+                line, _, rest = bytes(self._input).partition(b"\n")
+                self._input[:] = rest
+                self._handle(line.decode(errors="ignore").strip("\r"))
+        selector.close()
+
+    def _handle(self, line: str) -> None:
+        self.commands += 1
+        if self.response_delay:
+            time.sleep(self.response_delay)
+        if self.state == "login":
+            if line:
+                self.state = "password"
+                self._write("Password: ")
+            else:
+                self._write(f"{self.hostname} login: ")
+            return
+        if self.state == "password":
+            if line == self.password:
+                self.state = "shell"
+                self.cwd = "~"
+                self._write("\r\n" + self.prompt_text())
+            else:
+                self.state = "login"
+                self._write(f"\r\nLogin incorrect\r\n{self.hostname} login: ")
+            return
+
+        output = self._run(line)
+        for text in output:
+            self._write(text + "\r\n")
+        self._write(self.prompt_text())
+
+    def _run(self, line: str) -> list[str]:
+        command, _, argument = line.strip().partition(" ")
+        if not command:
+            return []
+        if command == "cd":
+            self.cwd = argument or "~"
+            return []
+        if command == "echo":
+            return [argument]
+        if command == "ps":
+            rows = ["  PID USER       VSZ STAT COMMAND", "    1 root      1636 S    init"]
+            rows += [f"{pid:5d} root     48212 S    {name}" for pid, name in sorted(self.processes.items())]
+            return rows
+        if command == "kill":
+            pid = argument.split()[-1] if argument else ""
+            if pid.isdigit() and int(pid) in self.processes:
+                del self.processes[int(pid)]
+                return []
+            return [f"sh: can't kill pid {pid}: No such process"]
+        if command == "rc-service" and argument.startswith("bnserver"):
+            action = argument.split()[-1]
+            return [f" * {'Stopping' if action == 'stop' else 'Starting'} bnserver ... [ ok ]"]
+        if command == "./start.sh" and self.cwd == "/usr/delta":
+            time.sleep(self.boot_delay)
+            self._start_processes()
+            return START_BANNER[:]
+        return [f"sh: {command}: not found"]
+
+    def close(self) -> None:
+        self._running = False
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self) -> ControllerSimulator:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--response-delay", type=float, default=0.0)
+    parser.add_argument("--boot-delay", type=float, default=1.0)
+    parser.add_argument("--baudrate", type=int, default=None)
+    parser.add_argument("--logged-in", action="store_true")
+    args = parser.parse_args()
+
+    with ControllerSimulator(logged_in=args.logged_in, response_delay=args.response_delay,
+                             boot_delay=args.boot_delay, baudrate=args.baudrate) as simulator:
+        print(f"Simulated controller on {simulator.port}. Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -1,9 +1,14 @@
 # type: ignore
-from pyDAQ.UniversalIO import UniversalIO
-from pyDAQ.UART import DAQ_UART
+from __future__ import annotations
+from expect import DaqUartStream, ExpectSession, ScriptError, ScriptResult, login_script, restart_bnserver_script
+from typing import TYPE_CHECKING
 import re
 import time
 
+if TYPE_CHECKING:
+    # Only needed for the hint; CPUConsole works with anything that has read_untils, write and close
+    from pyDAQ.UART import DAQ_UART
+
 
 ansi_escape = re.compile(rb'\x1B\[[0-9;]*[A-Za-z]') 
 new_line = re.compile(rb'\r\n')
@@ -44,18 +49,10 @@ class CPUConsole:
         except RuntimeError as e:
             raise RuntimeError(f"CPU Boot up timeout: {e}")
         
-    def login(self) -> None:
-        self.send("")
-        if self.read_until_prompt("login:", timeout=2):
-            self.send("root")
-        
-        if self.read_until_prompt("Password:", timeout=2):
-            self.send("b%9P$MdeQP][")
-        response = self.read_until_prompt("~#", timeout=2)
-        if response:
-            print("CPU login successful!")
-            self.send("echo Hello")
-            print(self.read_until_prompt("#"))
+    def login(self) -> ScriptResult:
+        result = ExpectSession(DaqUartStream(self._uart)).run(login_script())
+        print("CPU login successful!")
+        return result
 
     def redirect(self, dest_dir) -> str:
             try:
@@ -93,30 +90,20 @@ class CPUConsole:
             raise RuntimeError(f"Failed to kill process {process_id}: {e}")
     
 
-    def restart_bnserver(self) -> None:
+    def restart_bnserver(self) -> ScriptResult:
+        """
+        :return: how long each step of restart_bnserver_script() took
+        """
         try:
-            self.redirect("/usr/delta")
-            self.wait_for_shell_prompt("/usr/delta")
-            controller_pid = self.get_process_id("controller -service")
-            self.kill_process(controller_pid)
-            self.wait_for_shell_prompt("/usr/delta")
-            bnserver_pid = self.get_process_id("bnserver -service") 
-            self.kill_process(bnserver_pid)
-            self.wait_for_shell_prompt("/usr/delta")
-            self.send("rc-service bnserver stop")
-            self.wait_for_shell_prompt("/usr/delta")
-            self.send("rc-service bnserver start")
-            self.wait_for_shell_prompt("/usr/delta")
-            self.send("./start.sh")
-            if not self.read_until_prompt("ControllerStartup: Starting UltraCap Monitoring", verbose=True):
-                raise TimeoutError("Timeout during ./start.sh")
-            self.send("")
-            self.wait_for_shell_prompt("/usr/delta")
-        except Exception as e:
-            RuntimeError(f"Failed to restart bnserver with exception: {e}")
+            return ExpectSession(DaqUartStream(self._uart)).run(restart_bnserver_script())
+        except ScriptError as e:
+            raise RuntimeError(f"Failed to restart bnserver with exception: {e}") from e
        
 
 if __name__ == "__main__":
+    from pyDAQ.UniversalIO import UniversalIO
+    from pyDAQ.UART import DAQ_UART
+
     daq = UniversalIO()
     uart = DAQ_UART(daq, "EXP4", baudrate=115200, timeout=120)
     cpu_console = CPUConsole(uart)
\ No newline at end of file
@@ -0,0 +1,333 @@
+"""
+Send/expect scripts for the controller shell that run the same way over pyserial and over a DAQ UART.
+
+A script is a list of Send and Expect steps. It is compiled into a list of states, one per Expect: entering a state
+writes the commands that may go out at that point, then waits for the state's pattern. A Send marked pipeline=True
+does not wait for the previous command's prompt; the shell reads typed-ahead lines in order, so its output still
+arrives in order. Every Expect is timed.
+
+    python expect.py COM38 --login
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from ansi_stream import AnsiStripper
+from dataclasses import dataclass, field
+from string import Formatter
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import time
+
+ULTRACAP_STARTED = "ControllerStartup: Starting UltraCap Monitoring"
+
+
+class IByteStream(ABC):
+    @abstractmethod
+    def write(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, timeout: float, until: str = "") -> bytes:
+        """
+        Return the bytes that are available, waiting up to `timeout` seconds for at least one.
+        `until` is a hint: the backend may return early once it has seen it. b'' means nothing arrived.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SerialStream(IByteStream):
+    def __init__(self, ser: Any) -> None:
+        """
+        :param ser: an open serial.Serial
+        """
+        self._ser = ser
+
+    def write(self, data: bytes) -> None:
+        self._ser.write(data)
+
+    def read(self, timeout: float, until: str = "") -> bytes:
+        waiting = self._ser.in_waiting
+        if waiting:
+            return self._ser.read(waiting)
+        # Changing the timeout reconfigures the port, so only do it when it changes noticeably
+        if self._ser.timeout is None or abs(self._ser.timeout - timeout) > 0.05:
+            self._ser.timeout = timeout
+        return self._ser.read(1) + self._ser.read(self._ser.in_waiting)
+
+    def close(self) -> None:
+        self._ser.close()
+
+
+class DaqUartStream(IByteStream):
+    def __init__(self, uart: Any) -> None:
+        """
+        :param uart: a pyDAQ DAQ_UART
+        """
+        self._uart = uart
+
+    def write(self, data: bytes) -> None:
+        self._uart.write(data)
+
+    def read(self, timeout: float, until: str = "") -> bytes:
+        # The last character of the pattern, e.g. "#": escape codes inside a prompt can not hide it
+        return self._uart.read_untils(until[-1:] or "\n", timeout=timeout) or b''
+
+    def close(self) -> None:
+        self._uart.close()
+
+
+@dataclass(frozen=True)
+class Send:
+    # A str.format template over the stored variables, or a function of them
+    command: str | Callable[[Dict[str, str]], str]
+    # Write without waiting for the previous command's prompt
+    pipeline: bool = False
+
+
+@dataclass(frozen=True)
+class Expect:
+    pattern: str
+    timeout: float = 3
+    # Store everything read up to and including the pattern in this variable
+    store: str | None = None
+    name: str = ""
+
+
+Step = Send | Expect
+
+
+@dataclass
+class StepTiming:
+    name: str
+    seconds: float
+
+
+@dataclass
+class ScriptResult:
+    variables: Dict[str, str] = field(default_factory=dict)
+    timings: List[StepTiming] = field(default_factory=list)
+
+    @property
+    def seconds(self) -> float:
+        return sum(timing.seconds for timing in self.timings)
+
+
+class ScriptError(RuntimeError):
+    """
+    A step failed. `result` holds the variables and timings of the steps before it. `unconfirmed` lists commands
+    of other steps that had already been written but whose output was never matched, i.e. may or may not have run.
+    """
+    def __init__(self, step: str, reason: str, seconds: float, result: ScriptResult, unconfirmed: List[str]) -> None:
+        # The message without the step name
+        self.detail = reason + (f" (sent, not confirmed: {'; '.join(unconfirmed)})" if unconfirmed else "")
+        super().__init__(f"{step}: {self.detail}")
+        self.step = step
+        self.seconds = seconds
+        self.result = result
+        self.unconfirmed = unconfirmed
+
+
+class Script:
+    def __init__(self, steps: List[Step]) -> None:
+        if not steps or not isinstance(steps[-1], Expect):
+            raise ValueError("A script has to end with an Expect")
+        self.steps = steps
+        # states[k] = (sends written when expect k becomes active, expect k). Each send comes with the index of
+        # the expect that waits for its output, which is the step it is reported under
+        self.states: List[Tuple[List[Tuple[Send, int]], Expect]] = self._compile(steps)
+
+    def __add__(self, other: Script) -> Script:
+        return Script(self.steps + other.steps)
+
+    @staticmethod
+    def _compile(steps: List[Step]) -> List[Tuple[List[Tuple[Send, int]], Expect]]:
+        expects = [step for step in steps if isinstance(step, Expect)]
+        sends_for: List[List[Tuple[Send, int]]] = [[] for _ in expects]
+        expects_before = 0
+        # Expect whose variables the most recent stored value came from
+        last_store = -1
+        stored_by: Dict[str, int] = {}
+        # Sends go out in script order, so a send is never issued before the one in front of it
+        issue_at = 0
+        for step in steps:
+            if isinstance(step, Expect):
+                if step.store:
+                    stored_by[step.store] = expects_before
+                    last_store = expects_before
+                expects_before += 1
+                continue
+            if expects_before == len(expects):
+                raise ValueError(f"Nothing waits for the output of {step.command!r}")
+            if not step.pipeline:
+                # Wait for the prompt of the command before
+                ready = expects_before
+            elif callable(step.command):
+                ready = last_store + 1
+            else:
+                needed = [name for _, name, _, _ in Formatter().parse(step.command) if name]
+                ready = max([stored_by[name] + 1 for name in needed if name in stored_by], default=0)
+            issue_at = max(issue_at, ready)
+            sends_for[issue_at].append((step, expects_before))
+        return list(zip(sends_for, expects))
+
+
+class ScriptRun:
+    """
+    One pass through a script, without the I/O, so the blocking ExpectSession and the asyncio console walk scripts
+    the same way:
+
+        expect = run.next_expect(write)   # writes the commands due now; None once the script is done
+        output = ...wait for expect.pattern...; on failure raise run.error(e)
+        run.matched(output)
+
+    Errors name the step whose command or Expect failed, even when the command was typed ahead during an earlier step.
+    """
+    def __init__(self, script: Script, variables: Dict[str, str] | None = None) -> None:
+        self.result = ScriptResult(dict(variables or {}))
+        self._states = script.states
+        self._names = [expect.name or expect.pattern for _, expect in script.states]
+        self._index = 0
+        # Step the current failure would be reported under
+        self._failing = 0
+        # (step index, command) written but not matched yet
+        self._sent: List[Tuple[int, str]] = []
+        self._start = 0.0
+
+    def next_expect(self, write: Callable[[str], None]) -> Expect | None:
+        if self._index == len(self._states):
+            return None
+        self._start = time.perf_counter()
+        self._sent = [(owner, command) for owner, command in self._sent if owner >= self._index]
+        sends, expect = self._states[self._index]
+        for send, owner in sends:
+            self._failing = owner
+            try:
+                command = send.command(self.result.variables) if callable(send.command) else send.command.format(**self.result.variables)
+                write(command)
+            except Exception as e:
+                raise self.error(e) from e
+            self._sent.append((owner, command))
+        self._failing = self._index
+        return expect
+
+    def matched(self, output: str) -> None:
+        expect = self._states[self._index][1]
+        if expect.store:
+            self.result.variables[expect.store] = output
+        self.result.timings.append(StepTiming(self._names[self._index], time.perf_counter() - self._start))
+        self._index += 1
+
+    def error(self, e: Exception) -> ScriptError:
+        unconfirmed = [command for owner, command in self._sent if owner != self._failing]
+        return ScriptError(self._names[self._failing], str(e), time.perf_counter() - self._start, self.result, unconfirmed)
+
+
+class ExpectSession:
+    """
+    Runs scripts over one byte stream. Output is ANSI-stripped as it arrives. Text after a matched pattern
+    stays buffered for the next Expect.
+    """
+    def __init__(self, stream: IByteStream, verbose: bool = False) -> None:
+        self.stream = stream
+        self.verbose = verbose
+        self.buffer = bytearray()
+        self._stripper = AnsiStripper()
+
+    def send(self, command: str) -> None:
+        self.stream.write((command + '\n').encode())
+
+    def expect(self, pattern: str, timeout: float = 3) -> str:
+        pattern_bytes = pattern.encode()
+        deadline = time.monotonic() + timeout
+        search_from = 0
+        while True:
+            index = self.buffer.find(pattern_bytes, search_from)
+            if index != -1:
+                end = index + len(pattern_bytes)
+                output = bytes(self.buffer[:end]).decode("ascii", errors="ignore")
+                del self.buffer[:end]
+                if self.verbose:
+                    print(output)
+                return output
+            search_from = max(0, len(self.buffer) - len(pattern_bytes) + 1)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"Wait {pattern} command timeout")
+            self.buffer.extend(self._stripper.feed(self.stream.read(remaining, pattern)))
+
+    def run(self, script: Script, variables: Dict[str, str] | None = None) -> ScriptResult:
+        """
+        Raises ScriptError at the first step that times out or can not build its command.
+        """
+        run = ScriptRun(script, variables)
+        while True:
+            expect = run.next_expect(self.send)
+            if expect is None:
+                return run.result
+            try:
+                output = self.expect(expect.pattern, expect.timeout)
+            except Exception as e:
+                raise run.error(e) from e
+            run.matched(output)
+
+
+def find_process_id(ps_output: str, process_name: str) -> str:
+    for line in ps_output.splitlines():
+        if process_name not in line:
+            continue
+        process_details = line.strip().split(None, 3)
+        if len(process_details) >= 4 and process_details[0].isdigit():
+            return process_details[0]
+    raise RuntimeError(f"{process_name} id not found")
+
+
+def login_script(user: str = "root", password: str = "b%9P$MdeQP][") -> Script:
+    return Script([
+        Send(""), Expect("login:", 2, name="login prompt"),
+        Send(user), Expect("Password:", 2, name="password prompt"),
+        Send(password), Expect("~#", 2, name="logged in"),
+    ])
+
+
+def restart_bnserver_script(directory: str = "/usr/delta", startup_timeout: float = 60) -> Script:
+    """
+    restart_bnserver from iom_clear_script.py / daq_iom_clear_script.py without the extra empty-line round trips.
+    Everything after ps is typed ahead; the kill commands only wait for the ps output they need.
+    """
+    prompt = f"{directory}#"
+    return Script([
+        Send(""), Expect("#", name="shell"),
+        Send(f"cd {directory}"), Expect(prompt, name="redirect"),
+        Send("ps", pipeline=True), Expect(prompt, store="ps", name="ps"),
+        Send(lambda v: f"kill -9 {find_process_id(v['ps'], 'controller -service')}", pipeline=True),
+        Expect(prompt, name="kill controller"),
+        Send(lambda v: f"kill -9 {find_process_id(v['ps'], 'bnserver -service')}", pipeline=True),
+        Expect(prompt, name="kill bnserver"),
+        Send("rc-service bnserver stop", pipeline=True), Expect(prompt, name="bnserver stop"),
+        Send("rc-service bnserver start", pipeline=True), Expect(prompt, name="bnserver start"),
+        Send("./start.sh", pipeline=True), Expect(ULTRACAP_STARTED, startup_timeout, name="start.sh"),
+        Send(""), Expect(prompt, name="shell prompt"),
+    ])
+
+
+if __name__ == "__main__":
+    import serial
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("port")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--login", action="store_true", help="log in before restarting")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    session = ExpectSession(SerialStream(serial.Serial(args.port, args.baudrate, timeout=1)), args.verbose)
+    script = login_script() + restart_bnserver_script() if args.login else restart_bnserver_script()
+    try:
+        result = session.run(script)
+    finally:
+        session.stream.close()
+    for timing in result.timings:
+        print(f"{timing.name:<16} {timing.seconds * 1000:9.1f} ms")
+    print(f"{'total':<16} {result.seconds * 1000:9.1f} ms")
@@ -1,52 +1,127 @@
+from ansi_stream import AnsiStripper, ansi_escape
+from expect import ExpectSession, IByteStream, ScriptError, ScriptResult, login_script, restart_bnserver_script
+from session_capture import RX, TX, RingBuffer, TranscriptWriter
+from typing import Any
 import serial
 import threading
 import time
-import re
 
-ansi_escape = re.compile(rb'\x1B\[[0-9;]*[A-Za-z]') 
 
 class SerialConsole:
-    def __init__(self, port:str, baudrate:int=115200, timeout:int=1):
-        self.ser = serial.Serial(port, baudrate, timeout=timeout) 
-        self.buffer = bytearray()
+    def __init__(self, port:str, baudrate:int=115200, timeout:int=1, buffer_size:int=1 << 20,
+                 transcript: TranscriptWriter | None=None, ser: Any=None):
+        """
+        :param buffer_size: received text kept while nobody reads it; older text is dropped
+        :param transcript: optional recorder for everything received and sent
+        :param ser: an already open serial.Serial-like object (e.g. session_capture.ReplaySerial) instead of `port`
+        """
+        self.ser = ser if ser is not None else serial.Serial(port, baudrate, timeout=timeout)
+        # Received text with ANSI sequences already removed; consumed up to the end of each matched prompt
+        self.buffer = RingBuffer(buffer_size)
+        self.transcript = transcript
         self.lock = threading.Lock()
+        self.data_received = threading.Condition(self.lock)
+        self._stripper = AnsiStripper()
+        self._error: Exception | None = None
         self.running = True
         self.reader_thread = threading.Thread(target=self._reader, daemon=True)
         self.reader_thread.start()
         
     def _reader(self) -> None:
-        # [ ]: need exception handling
-        while self.running:
-            data = self.ser.read(self.ser.in_waiting or 1)
-            if data:
-                with self.lock:
-                    self.buffer.extend(data)
-# 
+        try:
+            while self.running:
+                data = self.ser.read(self.ser.in_waiting or 1)
+                if data:
+                    if self.transcript is not None:
+                        self.transcript.record(RX, data)
+                    clean = self._stripper.feed(data)
+                    with self.data_received:
+                        self.buffer.extend(clean)
+                        self.data_received.notify_all()
+        except (serial.SerialException, OSError) as e:
+            with self.data_received:
+                self._error = e
+                self.running = False
+                self.data_received.notify_all()
+
     def read_until_prompt(self, prompt:str='#', timeout:int=60, verbose:bool=False) -> str:
+        """
+        Wait for `prompt` and return everything up to and including it. Text after the prompt stays in the buffer
+        for the next call. The reader thread wakes this up as soon as data arrives, and only bytes that have not
+        been searched yet are searched again.
+        """
         prompt_bytes = prompt.encode()
-        start = time.time()
-        while time.time() - start < timeout:
-            with self.lock:
-                clean_response = ansi_escape.sub(b'', self.buffer)
-                if prompt_bytes in clean_response:
-                    index = clean_response.index(prompt_bytes)
-                    output = clean_response[:index + len(prompt_bytes)] 
+        deadline = time.monotonic() + timeout
+        search_from = 0
+        with self.data_received:
+            dropped = self.buffer.dropped
+            while True:
+                # Positions shift when the ring buffer overwrites its oldest bytes
+                search_from = max(0, search_from - (self.buffer.dropped - dropped))
+                dropped = self.buffer.dropped
+                index = self.buffer.find(prompt_bytes, search_from)
+                if index != -1:
+                    output = self.buffer.consume(index + len(prompt_bytes))
                     if verbose:
                         print(output.decode("ascii", errors="ignore"))
-                    self.buffer.clear()
                     return output.decode("ascii", errors="ignore")
-            time.sleep(0.1)
+                # The prompt may straddle the end of the buffer, so re-check its last len(prompt) - 1 bytes
+                search_from = max(0, len(self.buffer) - len(prompt_bytes) + 1)
+                if self._error is not None:
+                    raise RuntimeError(f"Serial port failed while waiting for {prompt}: {self._error}")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.data_received.wait(remaining)
         raise RuntimeError(f"Wait {prompt} command timeout")
 
+    def read_available(self, timeout: float) -> bytes:
+        """
+        Consume and return everything received so far, waiting up to `timeout` seconds for at least one byte.
+        """
+        deadline = time.monotonic() + timeout
+        with self.data_received:
+            while not len(self.buffer):
+                if self._error is not None:
+                    raise RuntimeError(f"Serial port failed: {self._error}")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return b''
+                self.data_received.wait(remaining)
+            return self.buffer.consume(len(self.buffer))
+
     def send(self, command:str) -> None:
+        self.write((command + '\n').encode())
+
+    def write(self, data: bytes) -> None:
         # [ ]: Need exception handling
-        self.ser.write((command + '\n').encode())
+        if self.transcript is not None:
+            self.transcript.record(TX, data)
+        self.ser.write(data)
 
     def close(self) -> None:
         self.running = False
         self.reader_thread.join()
         self.ser.close()
 
+class SerialConsoleStream(IByteStream):
+    """
+    Runs expect scripts through a SerialConsole. The console's reader thread owns the port, so bytes are taken
+    from its buffer (already ANSI-stripped) rather than read from the port, and sends still go to its transcript.
+    """
+    def __init__(self, console: SerialConsole) -> None:
+        self.console = console
+
+    def write(self, data: bytes) -> None:
+        self.console.write(data)
+
+    def read(self, timeout: float, until: str = "") -> bytes:
+        return self.console.read_available(timeout)
+
+    def close(self) -> None:
+        self.console.close()
+
+
 def wait_for_shell_prompt(console:SerialConsole, current_dir: str) -> None:
     console.send('')        
     if not console.read_until_prompt(f"{current_dir}#", timeout=3):
@@ -56,18 +131,10 @@ def wait_for_bootup(console: SerialConsole) -> None:
     if console.read_until_prompt('Controller Service is running'):
         print('Controller online')
    
-def login(console: SerialConsole) -> None:
-    console.send('')
-    if console.read_until_prompt('login:', timeout=2):
-        console.send('root')
-    
-    if console.read_until_prompt('Password:', timeout=2):
-        console.send('b%9P$MdeQP][')
-    output = console.read_until_prompt('~#', timeout=2)
-    if output:
-        print("Logged in!")
-        console.send('echo Hello')
-        print(console.read_until_prompt('#'))
+def login(console: SerialConsole) -> ScriptResult:
+    result = ExpectSession(SerialConsoleStream(console)).run(login_script())
+    print("Logged in!")
+    return result
         
 
 def get_process_id(console: SerialConsole, process_name: str) -> str:
@@ -108,29 +175,14 @@ def redirect(console: SerialConsole, destination_dir: str) -> None:
     except Exception as e:
         raise RuntimeError(f"Failed to redirect to {destination_dir} with exception: {e}")
     
-def restart_bnserver(console: SerialConsole) -> None:
-    redirect(console, "/usr/delta")
-    controller_pid = get_process_id(console, "controller -service")
-    bnserver_pid = get_process_id(console, "bnserver -service")
-    kill_process(console, controller_pid)
-    kill_process(console, bnserver_pid)
+def restart_bnserver(console: SerialConsole) -> ScriptResult:
+    """
+    :return: how long each step of restart_bnserver_script() took
+    """
     try:
-        wait_for_shell_prompt(console, "/usr/delta")
-        console.send("rc-service bnserver stop")
-        if not console.read_until_prompt("#", timeout=3):
-            raise TimeoutError("Timeout during bnserver stop")
-        console.send("rc-service bnserver start")
-        if not console.read_until_prompt("#", timeout=3):
-            raise TimeoutError("Timeout during bnserver start")
-        redirect(console, "/usr/delta")
-        console.send("./start.sh")
-        if not console.read_until_prompt("ControllerStartup: Starting UltraCap Monitoring", verbose=True):
-            raise TimeoutError("Timeout during ./start.sh")
-        console.send('')
-        wait_for_shell_prompt(console, "/usr/delta")
-    except Exception as e:
-        RuntimeError(f"Failed to restart bnserver with exception: {e}")
-
+        return ExpectSession(SerialConsoleStream(console)).run(restart_bnserver_script())
+    except ScriptError as e:
+        raise RuntimeError(f"Failed to restart bnserver with exception: {e}") from e
 
 
 if __name__ == '__main__':
@@ -0,0 +1,126 @@
+"""
+Run the bnserver restart script (expect.restart_bnserver_script) on many controllers at once and report how long
+each of its steps took.
+
+Each controller runs on its own worker thread (at most --concurrency at a time). A failure stops that controller's
+sequence only; the others carry on. Clearing a rack takes about as long as its slowest controller.
+
+    python restart_orchestrator.py COM38 COM39 COM40 --concurrency 8 --login
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from expect import ExpectSession, IByteStream, Script, ScriptError, login_script, restart_bnserver_script
+from iom_clear_script import SerialConsole, SerialConsoleStream
+from typing import Dict, List
+import argparse
+import statistics
+import time
+
+
+@dataclass
+class StepResult:
+    name: str
+    seconds: float
+    error: str | None = None
+
+
+@dataclass
+class ControllerReport:
+    name: str
+    steps: List[StepResult] = field(default_factory=list)
+    # Time spent waiting for a free worker before the first step
+    queued_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(step.error is None for step in self.steps)
+
+    @property
+    def seconds(self) -> float:
+        return sum(step.seconds for step in self.steps)
+
+    @property
+    def error(self) -> str | None:
+        return next((f"{step.name}: {step.error}" for step in self.steps if step.error is not None), None)
+
+
+class RestartOrchestrator:
+    def __init__(self, max_concurrency: int = 8, script: Script | None = None) -> None:
+        """
+        :param script: what to run on every controller, restart_bnserver_script() by default; its Expect steps are
+                       the steps of the report
+        """
+        self.max_concurrency = max_concurrency
+        self.script = restart_bnserver_script() if script is None else script
+
+    def run_one(self, name: str, stream: IByteStream, submitted: float | None = None) -> ControllerReport:
+        report = ControllerReport(name)
+        if submitted is not None:
+            report.queued_seconds = time.perf_counter() - submitted
+        try:
+            result = ExpectSession(stream).run(self.script)
+        except ScriptError as e:
+            result = e.result
+            failed = StepResult(e.step, e.seconds, e.detail)
+        else:
+            failed = None
+        report.steps = [StepResult(timing.name, timing.seconds) for timing in result.timings]
+        if failed is not None:
+            report.steps.append(failed)
+        return report
+
+    def run(self, streams: Dict[str, IByteStream]) -> List[ControllerReport]:
+        """
+        Run the script on every stream (name -> SerialConsoleStream / DaqUartStream). Reports come back in the given order.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency), thread_name_prefix="restart") as executor:
+            submitted = time.perf_counter()
+            futures = [executor.submit(self.run_one, name, stream, submitted) for name, stream in streams.items()]
+            return [future.result() for future in futures]
+
+
+def format_summary(reports: List[ControllerReport], wall_seconds: float | None = None) -> str:
+    step_names: List[str] = []
+    for report in reports:
+        for step in report.steps:
+            if step.name not in step_names:
+                step_names.append(step.name)
+
+    lines = [f"{'controller':<16} {'status':<7} {'queued s':>9} " + " ".join(f"{name[:12]:>12}" for name in step_names) + f" {'total s':>9}"]
+    for report in reports:
+        seconds = {step.name: step.seconds for step in report.steps}
+        cells = " ".join(f"{seconds[name]:12.2f}" if name in seconds else f"{'-':>12}" for name in step_names)
+        lines.append(f"{report.name:<16} {'ok' if report.ok else 'FAILED':<7} {report.queued_seconds:9.2f} {cells} {report.seconds:9.2f}")
+
+    lines.append("")
+    for name in step_names:
+        times = [step.seconds for report in reports for step in report.steps if step.name == name]
+        lines.append(f"{name:<16} median {statistics.median(times):7.2f} s   max {max(times):7.2f} s")
+    failed = [report for report in reports if not report.ok]
+    lines.append(f"{len(reports) - len(failed)}/{len(reports)} controllers restarted"
+                 + (f" in {wall_seconds:.1f} s" if wall_seconds is not None else ""))
+    for report in failed:
+        lines.append(f"  {report.name}: {report.error}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ports", nargs="+", help="serial ports of the controllers")
+    parser.add_argument("--concurrency", type=int, default=8, help="controllers restarted at the same time")
+    parser.add_argument("--login", action="store_true", help="log in before restarting")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    args = parser.parse_args()
+
+    streams: Dict[str, IByteStream] = {}
+    try:
+        for port in args.ports:
+            streams[port] = SerialConsoleStream(SerialConsole(port, args.baudrate))
+        orchestrator = RestartOrchestrator(args.concurrency, login_script() + restart_bnserver_script() if args.login else None)
+        start = time.perf_counter()
+        reports = orchestrator.run(streams)
+        print(format_summary(reports, time.perf_counter() - start))
+    finally:
+        for stream in streams.values():
+            stream.close()
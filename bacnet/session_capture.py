@@ -0,0 +1,251 @@
+"""
+Bounded receive buffer, session transcripts and transcript replay for the serial consoles.
+
+A transcript is a memory-mapped file of (monotonic time, direction, bytes) records. ReplaySerial plays one back with
+the pyserial interface SerialConsole and SerialStream use, so console code can be profiled and regression tested
+without a controller.
+
+    python session_capture.py dump session.bin
+"""
+from __future__ import annotations
+from typing import Iterator, List, Tuple
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+
+RX = 0
+TX = 1
+
+_MAGIC = b"SNCAPT01"
+# magic, bytes used (header included), wall clock time of the first record
+_HEADER = struct.Struct("<8sQd")
+# seconds since the first record, direction, payload length
+_RECORD = struct.Struct("<dBI")
+
+
+class RingBuffer:
+    """
+    Fixed-capacity byte FIFO. When it is full, the oldest bytes are overwritten and counted in `dropped`.
+    Indexes passed to find() and consume() are relative to the oldest byte still held.
+    """
+    def __init__(self, capacity: int = 1 << 20) -> None:
+        if capacity <= 0:
+            raise ValueError("RingBuffer capacity must be positive")
+        self.capacity = capacity
+        self._data = bytearray(capacity)
+        self._head = 0
+        self._size = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def extend(self, data: bytes) -> None:
+        if len(data) >= self.capacity:
+            self.dropped += self._size + len(data) - self.capacity
+            self._data[:] = data[-self.capacity:]
+            self._head, self._size = 0, self.capacity
+            return
+        overflow = self._size + len(data) - self.capacity
+        if overflow > 0:
+            self._head = (self._head + overflow) % self.capacity
+            self._size -= overflow
+            self.dropped += overflow
+        tail = (self._head + self._size) % self.capacity
+        first = min(len(data), self.capacity - tail)
+        self._data[tail:tail + first] = data[:first]
+        self._data[:len(data) - first] = data[first:]
+        self._size += len(data)
+
+    def peek(self, start: int = 0, end: int | None = None) -> bytes:
+        end = self._size if end is None else min(end, self._size)
+        if start >= end:
+            return b''
+        a, b = (self._head + start) % self.capacity, (self._head + end) % self.capacity
+        if a < b or b == 0:
+            return bytes(self._data[a:b or self.capacity])
+        return bytes(self._data[a:]) + bytes(self._data[:b])
+
+    def find(self, pattern: bytes, start: int = 0) -> int:
+        start = max(start, 0)
+        first_len = min(self._size, self.capacity - self._head)
+        if start < first_len:
+            index = self._data.find(pattern, self._head + start, self._head + first_len)
+            if index != -1:
+                return index - self._head
+        if first_len == self._size:
+            return -1
+        # Matches that cross the wrap point
+        seam_start = max(start, first_len - len(pattern) + 1)
+        seam = self.peek(seam_start, first_len + len(pattern) - 1)
+        index = seam.find(pattern)
+        if index != -1:
+            return seam_start + index
+        index = self._data.find(pattern, max(0, start - first_len), self._size - first_len)
+        return -1 if index == -1 else first_len + index
+
+    def consume(self, count: int) -> bytes:
+        data = self.peek(0, count)
+        self._head = (self._head + len(data)) % self.capacity
+        self._size -= len(data)
+        return data
+
+    def clear(self) -> None:
+        self._head = self._size = 0
+
+
+class TranscriptWriter:
+    """
+    Appends every chunk to a memory-mapped file, growing it as needed. Safe to call from the reader thread and
+    the sending thread at the same time.
+    """
+    def __init__(self, path: str, initial_size: int = 1 << 20) -> None:
+        self.path = path
+        self._file = open(path, "w+b")
+        self._file.truncate(max(initial_size, _HEADER.size + _RECORD.size))
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.size
+        self._start = time.monotonic()
+        _HEADER.pack_into(self._mm, 0, _MAGIC, self._used, time.time())
+        self._lock = threading.Lock()
+
+    def record(self, direction: int, data: bytes) -> None:
+        timestamp = time.monotonic() - self._start
+        with self._lock:
+            if self._mm.closed:
+                return
+            end = self._used + _RECORD.size + len(data)
+            if end > len(self._mm):
+                self._mm.resize(max(end, 2 * len(self._mm)))
+            _RECORD.pack_into(self._mm, self._used, timestamp, direction, len(data))
+            self._mm[self._used + _RECORD.size:end] = data
+            self._used = end
+            # Readers trust this length, so a crash loses at most the record being written
+            struct.pack_into("<Q", self._mm, 8, self._used)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mm.closed:
+                return
+            self._mm.flush()
+            self._mm.close()
+            self._file.truncate(self._used)
+            self._file.close()
+
+
+def read_transcript(path: str) -> Iterator[Tuple[float, int, bytes]]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, used, _ = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a session transcript")
+        offset = _HEADER.size
+        while offset + _RECORD.size <= used:
+            timestamp, direction, length = _RECORD.unpack_from(mm, offset)
+            offset += _RECORD.size
+            yield timestamp, direction, bytes(mm[offset:offset + length])
+            offset += length
+
+
+class ReplaySerial:
+    """
+    Plays the received side of a transcript back with the subset of the serial.Serial interface the consoles use.
+
+    Gaps between chunks are replayed divided by `speed` (0 replays as fast as possible). With `follow_writes`,
+    a chunk that was recorded after the console sent something is held back until the console has sent as many
+    bytes again, so accelerated replays stay in step with the script that drives them. Sent bytes are kept in `written`.
+    """
+    def __init__(self, path: str, speed: float = 1.0, follow_writes: bool = True, timeout: float | None = 1) -> None:
+        self.timeout = timeout
+        self.written = bytearray()
+        self._speed = speed
+        self._follow_writes = follow_writes
+        # (seconds since the previous received chunk, bytes sent before it, data)
+        self._chunks: List[Tuple[float, int, bytes]] = []
+        sent = 0
+        previous = None
+        for timestamp, direction, data in read_transcript(path):
+            if direction == TX:
+                sent += len(data)
+                continue
+            self._chunks.append((0.0 if previous is None else timestamp - previous, sent, data))
+            previous = timestamp
+        self._next = 0
+        self._released_at = time.monotonic()
+        self._pending = bytearray()
+        self._condition = threading.Condition()
+        self.is_open = True
+
+    def _release(self) -> float | None:
+        """
+        Move due chunks into the pending buffer. Return how long until the next one is due, None if it waits for writes
+        or the transcript is exhausted.
+        """
+        while self._next < len(self._chunks):
+            gap, sent_before, data = self._chunks[self._next]
+            if self._follow_writes and len(self.written) < sent_before:
+                return None
+            due = self._released_at + (gap / self._speed if self._speed > 0 else 0.0)
+            now = time.monotonic()
+            if due > now:
+                return due - now
+            self._pending.extend(data)
+            self._released_at = max(due, now) if self._speed <= 0 else due
+            self._next += 1
+        return None
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next >= len(self._chunks) and not self._pending
+
+    @property
+    def in_waiting(self) -> int:
+        with self._condition:
+            self._release()
+            return len(self._pending)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                wait = self._release()
+                if self._pending:
+                    data = bytes(self._pending[:size])
+                    del self._pending[:size]
+                    return data
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0 or not self.is_open:
+                    return b''
+                if wait is not None and (remaining is None or wait < remaining):
+                    remaining = wait
+                self._condition.wait(remaining)
+
+    def write(self, data: bytes) -> int:
+        with self._condition:
+            if self._follow_writes and self._next < len(self._chunks) and len(self.written) < self._chunks[self._next][1]:
+                # Time the gap from when the console caught up, not from the previous chunk
+                self._released_at = max(self._released_at, time.monotonic())
+            self.written.extend(data)
+            self._condition.notify_all()
+        return len(data)
+
+    def close(self) -> None:
+        with self._condition:
+            self.is_open = False
+            self._condition.notify_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    dump_parser = subparsers.add_parser("dump", help="print a transcript")
+    dump_parser.add_argument("path")
+    args = parser.parse_args()
+
+    count = 0
+    for timestamp, direction, data in read_transcript(args.path):
+        print(f"{timestamp:10.4f} {'<' if direction == RX else '>'} {data!r}")
+        count += 1
+    print(f"{count} records, {os.path.getsize(args.path)} bytes")
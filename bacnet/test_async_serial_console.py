@@ -0,0 +1,53 @@
+from async_serial_console import AsyncSerialConsole
+from controller_simulator import ControllerSimulator
+from expect import ScriptError, restart_bnserver_script
+import asyncio
+import os
+import pytest
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="ControllerSimulator runs on a pty")
+
+
+@pytest.fixture
+def simulator():
+    simulator = ControllerSimulator(boot_delay=0.05)
+    yield simulator
+    simulator.close()
+
+
+async def open_console(simulator: ControllerSimulator) -> AsyncSerialConsole:
+    return await AsyncSerialConsole.from_fd(os.open(simulator.port, os.O_RDWR | os.O_NOCTTY), simulator.port)
+
+
+def test_login_and_restart_run_the_expect_scripts(simulator):
+    async def scenario():
+        console = await open_console(simulator)
+        try:
+            login = await console.login()
+            restart = await console.restart_bnserver()
+        finally:
+            await console.close()
+        return login, restart
+
+    login, restart = asyncio.run(scenario())
+    assert [timing.name for timing in login.timings] == ["login prompt", "password prompt", "logged in"]
+    assert [timing.name for timing in restart.timings] == [
+        "shell", "redirect", "ps", "kill controller", "kill bnserver", "bnserver stop", "bnserver start", "start.sh", "shell prompt"]
+
+
+def test_script_failure_names_the_failed_step(simulator):
+    simulator.state = "shell"
+    for pid, command in list(simulator.processes.items()):
+        if "bnserver -service" in command:
+            del simulator.processes[pid]
+
+    async def scenario():
+        console = await open_console(simulator)
+        try:
+            await console.run_script(restart_bnserver_script())
+        finally:
+            await console.close()
+
+    with pytest.raises(ScriptError) as error:
+        asyncio.run(scenario())
+    assert error.value.step == "kill bnserver"
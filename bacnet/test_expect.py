@@ -0,0 +1,60 @@
+from controller_simulator import ControllerSimulator
+from expect import ExpectSession, ScriptError, login_script, restart_bnserver_script
+from iom_clear_script import SerialConsole, SerialConsoleStream
+from restart_orchestrator import RestartOrchestrator
+import os
+import pytest
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="ControllerSimulator runs on a pty")
+
+
+@pytest.fixture
+def simulator():
+    simulator = ControllerSimulator(logged_in=True, boot_delay=0.05)
+    yield simulator
+    simulator.close()
+
+
+@pytest.fixture
+def stream(simulator):
+    stream = SerialConsoleStream(SerialConsole(simulator.port))
+    yield stream
+    stream.close()
+
+
+def remove_process(simulator: ControllerSimulator, name: str) -> None:
+    for pid, command in list(simulator.processes.items()):
+        if name in command:
+            del simulator.processes[pid]
+
+
+def test_restart_script_reports_every_step(stream):
+    result = ExpectSession(stream).run(restart_bnserver_script())
+    assert [timing.name for timing in result.timings] == [
+        "shell", "redirect", "ps", "kill controller", "kill bnserver", "bnserver stop", "bnserver start", "start.sh", "shell prompt"]
+
+
+def test_failure_names_the_step_that_failed_and_what_was_already_sent(simulator, stream):
+    remove_process(simulator, "bnserver -service")
+    controller_pid = next(pid for pid, command in simulator.processes.items() if "controller -service" in command)
+    with pytest.raises(ScriptError) as error:
+        ExpectSession(stream).run(restart_bnserver_script())
+    # Typed ahead while "kill controller" was active, but it is the bnserver pid lookup that failed
+    assert error.value.step == "kill bnserver"
+    assert "bnserver -service id not found" in error.value.detail
+    assert error.value.unconfirmed == [f"kill -9 {controller_pid}"]
+    assert [timing.name for timing in error.value.result.timings] == ["shell", "redirect", "ps"]
+
+
+def test_orchestrator_reports_the_failed_step(simulator, stream):
+    remove_process(simulator, "bnserver -service")
+    report = RestartOrchestrator(1).run({"sim": stream})[0]
+    assert not report.ok
+    assert [step.name for step in report.steps] == ["shell", "redirect", "ps", "kill bnserver"]
+    assert report.error.startswith("kill bnserver: bnserver -service id not found")
+
+
+def test_login_script(stream, simulator):
+    simulator.state = "login"
+    result = ExpectSession(stream).run(login_script())
+    assert [timing.name for timing in result.timings] == ["login prompt", "password prompt", "logged in"]
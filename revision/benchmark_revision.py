@@ -0,0 +1,150 @@
+"""
+Compare the revision classes before and after single-pass parsing, interning and precomputed sort keys,
+and RevisionArray. Times parsing a realistic mix of DCI and SAP revision strings (few distinct values, many repeats),
+sorting the parsed list, and comparing every revision against a threshold.
+
+    python benchmark_revision.py --count 200000
+"""
+from __future__ import annotations
+from functools import total_ordering
+from typing import Any, Callable, List
+from revision import BaseRevision, parse_revision
+from revision_array import RevisionArray
+import argparse
+import random
+import re
+import time
+
+
+@total_ordering
+class LegacyRevision:
+    """
+    Revision as it was before this change, for comparison. Validation is trimmed; the hot paths are unchanged.
+    """
+    _reRev = re.compile(r'^(?P<major>\d{1,2})\.(?P<minor>\d{1,2})(?P<alpha>[a-z])?(?:\.(?P<FA>[A-Z]))?$')
+
+    def __init__(self, rev: Any) -> None:
+        if isinstance(rev, bytes):
+            rev = str(rev.decode("utf-8"))
+        if rev is None or not str(rev).strip():
+            raise ValueError("DCI Revision does not support NULL or empty string")
+        m = self._reRev.match(str(rev))
+        if not m:
+            raise ValueError('Invalid revision number. Please use format 1.2[a][.B]')
+        self.MAJOR = int(m.group('major'))
+        self.MINOR = 0 if not m.group('minor') else int(m.group('minor'))
+        self.ALPHA = None if not m.group('alpha') else m.group('alpha')
+        self.FA = None if not m.group('FA') else m.group('FA')
+
+    @property
+    def _value(self) -> int:
+        alpha_val = 0 if not self.ALPHA else (ord(self.ALPHA) - ord('a') + 1) * 100
+        fa_val = 0 if not self.FA else (ord(self.FA) - ord('A') + 1)
+        return self.MAJOR * 100000 + self.MINOR * 10000 + alpha_val + fa_val
+
+    def _key(self) -> int:
+        return self._value
+
+    def __eq__(self, other: object) -> bool:
+        return _legacy_cmp(self, other) == 0
+
+    def __lt__(self, other: object) -> bool:
+        return _legacy_cmp(self, other) < 0
+
+
+@total_ordering
+class LegacySAPRevision:
+    _sap_revision_regex = re.compile(r'^\d{2}$')
+
+    def __init__(self, rev: Any) -> None:
+        if rev is None:
+            raise ValueError("SAPRevision can not be NULL.")
+        if isinstance(rev, bytes):
+            rev = rev.decode()
+        if not isinstance(rev, (str, int)):
+            raise TypeError(f"Can not convert {type(rev)} to SAPRevision")
+        self._value = str(rev)
+        if not self._sap_revision_regex.match(self._value):
+            raise ValueError(f"{self._value} is not valid SAP Revision format.")
+
+    def _key(self) -> int:
+        return int(self._value)
+
+    def __eq__(self, other: object) -> bool:
+        return _legacy_cmp(self, other) == 0
+
+    def __lt__(self, other: object) -> bool:
+        return _legacy_cmp(self, other) < 0
+
+
+def _legacy_cmp(this: Any, other: Any) -> int:
+    if not isinstance(other, (LegacyRevision, LegacySAPRevision)):
+        raise TypeError(f"Can not compare {type(this)} with {type(other)}")
+    if isinstance(this, LegacySAPRevision) and isinstance(other, LegacyRevision):
+        return 1
+    elif isinstance(this, LegacyRevision) and isinstance(other, LegacySAPRevision):
+        return -1
+    return (this._key() > other._key()) - (this._key() < other._key())
+
+
+def legacy_from_value(rev_value: Any) -> Any:
+    try:
+        return LegacySAPRevision(rev_value)
+    except (ValueError, TypeError):
+        return LegacyRevision(rev_value)
+
+
+def make_values(count: int, distinct: int) -> List[str]:
+    pool = set()
+    while len(pool) < distinct:
+        if random.random() < 0.2:
+            pool.add(f"{random.randint(0, 99):02d}")
+        else:
+            text = f"{random.randint(1, 9)}.{random.randint(0, 12)}"
+            if random.random() < 0.6:
+                text += random.choice("abcdef")
+                if random.random() < 0.3:
+                    text += "." + random.choice("ABC")
+            pool.add(text)
+    distinct_values = sorted(pool)
+    return [random.choice(distinct_values) for _ in range(count)]
+
+
+def timed(fn: Callable[[], Any]) -> tuple[float, Any]:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(name: str, parse: Callable[[Any], Any], values: List[str]) -> None:
+    parse_time, revisions = timed(lambda: [parse(value) for value in values])
+    sort_time, _ = timed(lambda: sorted(revisions))
+    threshold = parse("1.5a")
+    compare_time, newer = timed(lambda: sum(1 for rev in revisions if rev >= threshold))
+    print(f"{name:<8} parse: {parse_time * 1000:8.1f} ms   sort: {sort_time * 1000:8.1f} ms   "
+          f"compare: {compare_time * 1000:8.1f} ms   ({newer} >= 1.5a)")
+
+
+def run_array(values: List[str]) -> None:
+    parse_time, revisions = timed(lambda: RevisionArray(values))
+    sort_time, _ = timed(lambda: revisions.sorted())
+    compare_time, newer = timed(lambda: int((revisions >= "1.5a").sum()))
+    print(f"{'array':<8} parse: {parse_time * 1000:8.1f} ms   sort: {sort_time * 1000:8.1f} ms   "
+          f"compare: {compare_time * 1000:8.1f} ms   ({newer} >= 1.5a)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200000, help="revisions to parse")
+    parser.add_argument("--distinct", type=int, default=300, help="distinct revision strings among them")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    values = make_values(args.count, args.distinct)
+    print(f"{args.count} revisions, {args.distinct} distinct")
+    run("legacy", legacy_from_value, values)
+    parse_revision.cache_clear()
+    run("current", BaseRevision.from_value, values)
+    parse_revision.cache_clear()
+    run_array(values)
@@ -1,12 +1,28 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from functools import total_ordering
+from functools import lru_cache
 from time import sleep
+from typing import Any
 import re
 
+# Integer encoding, also used as the sort key. It is stored in databases (see revision_sql.py), so never change it.
+#   DCI: MAJOR * 1_000_000 + MINOR * 10_000 + alpha * 100 + FA, where alpha a..z is 1..26 and FA A..Z is 1..26
+#        1.2 -> 1020000, 1.2a -> 1020100, 1.2a.B -> 1020102, 99.99z.Z -> 99992626
+#   SAP: 100_000_000 + the number, 05 -> 100000005
+# Every DCI value is below the SAP offset, so SAP revisions sort after DCI revisions.
+_SAP_OFFSET = 100_000_000
+
+# Both formats in one pattern, so parsing an unknown value is a single match
+_reAnyRev = re.compile(r'^(?:(?P<sap>\d{2})|(?P<major>\d{1,2})\.(?P<minor>\d{1,2})(?P<alpha>[a-z])?(?:\.(?P<FA>[A-Z]))?)$')
+
 
-@total_ordering
 class BaseRevision(ABC):
+    """
+    Revisions are immutable and hashable. The comparison key is computed once, when the revision is parsed.
+    """
+    __slots__ = ()
+    _sort_key: int
+
     @abstractmethod
     def _key(self) -> int:
         """
@@ -19,36 +35,68 @@ class BaseRevision(ABC):
     def from_value(rev_value: str | int | float | bytes | Revision | SAPRevision) -> Revision | SAPRevision:
         if not isinstance(rev_value, (str, int, float, bytes, Revision, SAPRevision)):
             raise TypeError(f"Does not support converting {type(rev_value)} to BaseRevision")
-        try:
-            return SAPRevision(rev_value)
-        except (ValueError, TypeError):
-            return Revision(rev_value)
+        return parse_revision(rev_value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self) -> tuple:
+        # The default slots pickling goes through __setattr__
+        return type(self), (str(self),)
+
+    def __hash__(self) -> int:
+        # Tagged so a revision does not share a hash with the integer its sort key happens to be
+        return hash((BaseRevision, self._sort_key))
 
     def __eq__(self, other: object) -> bool:
-        if isinstance(other, (Revision, SAPRevision)):
-            return self._cmp_value(other) == 0
+        if isinstance(other, BaseRevision):
+            return self._sort_key == other._sort_key
+        # Lets sets and dicts hold revisions next to other keys; ordering still raises
+        return NotImplemented
+
+    def __lt__(self, other: object) -> bool:
+        if isinstance(other, BaseRevision):
+            return self._sort_key < other._sort_key
         else:
             raise TypeError(f"Can not compare {type(self)} with {type(other)}")
 
-    def __lt__(self, other: object) -> bool:
-        if isinstance(other, (Revision, SAPRevision)):
-            return self._cmp_value(other) < 0
+    def __le__(self, other: object) -> bool:
+        if isinstance(other, BaseRevision):
+            return self._sort_key <= other._sort_key
         else:
             raise TypeError(f"Can not compare {type(self)} with {type(other)}")
 
-    def _cmp_value(self, other: Revision | SAPRevision) -> int:
-        if isinstance(self, SAPRevision) and isinstance(other, Revision):
-            return 1
-        elif isinstance(self, Revision) and isinstance(other, SAPRevision):
-            return -1
+    def __gt__(self, other: object) -> bool:
+        if isinstance(other, BaseRevision):
+            return self._sort_key > other._sort_key
+        else:
+            raise TypeError(f"Can not compare {type(self)} with {type(other)}")
+
+    def __ge__(self, other: object) -> bool:
+        if isinstance(other, BaseRevision):
+            return self._sort_key >= other._sort_key
         else:
-            return (self._key() > other._key()) - (self._key() < other._key())
+            raise TypeError(f"Can not compare {type(self)} with {type(other)}")
+
+    def _cmp_value(self, other: Revision | SAPRevision) -> int:
+        return (self._sort_key > other._sort_key) - (self._sort_key < other._sort_key)
 
 
 class Revision(BaseRevision):
+    __slots__ = ("MAJOR", "MINOR", "ALPHA", "FA", "_text", "_sort_key")
+
     # updated regex: minor group should be mandatory and should support 2-digits (was 1-digit before)
     _reRev = re.compile(r'^(?P<major>\d{1,2})\.(?P<minor>\d{1,2})(?P<alpha>[a-z])?(?:\.(?P<FA>[A-Z]))?$')
 
+    MAJOR: int
+    MINOR: int
+    ALPHA: str | None
+    FA: str | None
+    _text: str
+
     def __init__(self, rev: str | float | bytes | Revision | None=None):
 
         if isinstance(rev, bytes):
@@ -60,33 +108,30 @@ class Revision(BaseRevision):
         m = self._reRev.match(str(rev))
         if not m:
             raise ValueError('Invalid revision number. Please use format 1.2[a][.B]')
-        self.MAJOR = int(m.group('major'))
-        self.MINOR = 0 if not m.group('minor') else int(m.group('minor'))
-        self.ALPHA = None if not m.group('alpha') else m.group('alpha')
-        self.FA = None if not m.group('FA') else m.group('FA')
+        self._set_fields(int(m.group('major')), int(m.group('minor')), m.group('alpha'), m.group('FA'))
 
-        if self.FA and not self.ALPHA:
+    def _set_fields(self, major: int, minor: int, alpha: str | None, fa: str | None) -> None:
+        if fa and not alpha:
             raise ValueError("FA field can only appear if alpha group is present")
 
-    @property
-    def _text(self) -> str:
-        rslt = str(self.MAJOR) + '.'
-        rslt += str(self.MINOR)
-        rslt += '' if (self.ALPHA is None) else self.ALPHA # Only append if needed
-        rslt += '' if (self.FA is None) else '.' + self.FA # Only append if needed
-        return rslt
+        alpha_val = 0 if not alpha else (ord(alpha) - ord('a') + 1) * 100
+        fa_val = 0 if not fa else (ord(fa) - ord('A') + 1)
+        text = str(major) + '.' + str(minor)
+        text += '' if (alpha is None) else alpha  # Only append if needed
+        text += '' if (fa is None) else '.' + fa  # Only append if needed
+
+        set_field = object.__setattr__
+        set_field(self, "MAJOR", major)
+        set_field(self, "MINOR", minor)
+        set_field(self, "ALPHA", alpha)
+        set_field(self, "FA", fa)
+        set_field(self, "_text", text)
+        # MINOR has two digits, so it needs its own two decimal places below MAJOR
+        set_field(self, "_sort_key", major * 1_000_000 + minor * 10_000 + alpha_val + fa_val)
 
     @property
     def _value(self) -> int:
-        alpha_val = 0 if not self.ALPHA else (ord(self.ALPHA) - ord('a') + 1) * 100
-        fa_val = 0 if not self.FA else (ord(self.FA) - ord('A') + 1)
-        value = (
-            self.MAJOR * 100000 +
-            self.MINOR * 10000 +
-            alpha_val +
-            fa_val
-        )
-        return value
+        return self._sort_key
 
     def __repr__(self) -> str:
         return self._text
@@ -95,13 +140,17 @@ class Revision(BaseRevision):
         return self._text
 
     def _key(self) -> int:
-        return self._value
+        return self._sort_key
+
 
 class SAPRevision(BaseRevision):
+    __slots__ = ("_value", "_sort_key")
+
     _sap_revision_regex = re.compile(r'^\d{2}$')
 
+    _value: str
+
     def __init__(self, rev: str | int | bytes | SAPRevision | None=None):
-        self._value: str = ""
         if rev is None:
             raise ValueError("SAPRevision can not be NULL.")
         if isinstance(rev, bytes):
@@ -109,16 +158,20 @@ class SAPRevision(BaseRevision):
         if isinstance(rev, (str, int, SAPRevision)):
             if str(rev).strip() == "":
                 raise ValueError("SAPRevision can not empty")
-            else:
-                self._value = str(rev)
+            value = str(rev)
 
-            format_match = self._sap_revision_regex.match(self._value)
+            format_match = self._sap_revision_regex.match(value)
 
             if not format_match:
-                raise ValueError( f"{self._value} is not valid SAP Revision format.")
+                raise ValueError( f"{value} is not valid SAP Revision format.")
 
         else:
             raise TypeError(f"Can not convert {type(rev)} to SAPRevision")
+        self._set_fields(value)
+
+    def _set_fields(self, value: str) -> None:
+        object.__setattr__(self, "_value", value)
+        object.__setattr__(self, "_sort_key", _SAP_OFFSET + int(value))
 
     def __repr__(self) -> str:
         return self._value
@@ -127,5 +180,56 @@ class SAPRevision(BaseRevision):
         return self._value
 
     def _key(self) -> int:
-        return int(self._value)
-
+        return self._sort_key - _SAP_OFFSET
+
+
+@lru_cache(maxsize=4096, typed=True)
+def parse_revision(rev_value: str | int | float | bytes | Revision | SAPRevision) -> Revision | SAPRevision:
+    """
+    Parse a DCI or SAP revision with one regex match. Equal inputs return the same (immutable) instance.
+    Accepts the same values as BaseRevision.from_value.
+    :return:
+    """
+    if isinstance(rev_value, BaseRevision):
+        return rev_value  # type: ignore[return-value]
+    if isinstance(rev_value, bytes):
+        rev_value = rev_value.decode("utf-8")
+    text = str(rev_value)
+    if not text.strip():
+        raise ValueError("DCI Revision does not support NULL or empty string")
+
+    m = _reAnyRev.match(text)
+    if not m:
+        raise ValueError('Invalid revision number. Please use format 1.2[a][.B]')
+    if m.group('sap') is not None:
+        sap = SAPRevision.__new__(SAPRevision)
+        sap._set_fields(m.group('sap'))
+        return sap
+    rev = Revision.__new__(Revision)
+    rev._set_fields(int(m.group('major')), int(m.group('minor')), m.group('alpha'), m.group('FA'))
+    return rev
+
+
+def encode_revision(rev_value: str | int | float | bytes | Revision | SAPRevision) -> int:
+    """
+    Stable integer encoding of a DCI or SAP revision. Ordering the integers orders the revisions.
+    :return:
+    """
+    return parse_revision(rev_value)._sort_key
+
+
+@lru_cache(maxsize=4096)
+def decode_revision(key: int) -> Revision | SAPRevision:
+    """
+    Inverse of encode_revision
+    :return:
+    """
+    if _SAP_OFFSET <= key < _SAP_OFFSET + 100:
+        return parse_revision(f"{key - _SAP_OFFSET:02d}")
+    alpha, fa = key // 100 % 100, key % 100
+    if not 0 <= key < _SAP_OFFSET or alpha > 26 or fa > 26:
+        raise ValueError(f"{key} is not an encoded revision")
+    text = f"{key // 1_000_000}.{key // 10_000 % 100}"
+    text += '' if not alpha else chr(ord('a') + alpha - 1)
+    text += '' if not fa else '.' + chr(ord('A') + fa - 1)
+    return parse_revision(text)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+from typing import Any, Dict, Hashable, Iterable, Iterator, Sequence
+from revision import BaseRevision, Revision, SAPRevision, decode_revision, parse_revision
+import numpy as np
+
+RevisionLike = str | int | float | bytes | Revision | SAPRevision
+
+
+class RevisionArray:
+    """
+    A sequence of DCI and SAP revisions stored as one int64 array of sort keys.
+
+    Keys order exactly like the revision objects do (SAP after DCI), so sorting, max and comparisons run in NumPy.
+    Indexing with an integer returns a Revision/SAPRevision; slices, masks and index arrays return a RevisionArray.
+    Comparison operators return boolean arrays, like NumPy's.
+    """
+    __slots__ = ("_keys",)
+
+    def __init__(self, values: Iterable[RevisionLike] = ()) -> None:
+        self._keys = np.fromiter((parse_revision(value)._sort_key for value in values), dtype=np.int64)
+        self._keys.flags.writeable = False
+
+    @classmethod
+    def from_keys(cls, keys: Any) -> RevisionArray:
+        """
+        Wrap an array of sort keys, e.g. one loaded from the database or produced by a NumPy operation.
+        """
+        array = cls.__new__(cls)
+        array._keys = np.asarray(keys, dtype=np.int64)
+        array._keys.flags.writeable = False
+        return array
+
+    @property
+    def keys(self) -> np.ndarray:
+        """
+        The sort keys, read-only.
+        """
+        return self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __getitem__(self, item: Any) -> Any:
+        if isinstance(item, (int, np.integer)):
+            return decode_revision(int(self._keys[item]))
+        return RevisionArray.from_keys(self._keys[item])
+
+    def __iter__(self) -> Iterator[Revision | SAPRevision]:
+        return (decode_revision(key) for key in self._keys.tolist())
+
+    def tolist(self) -> list[Revision | SAPRevision]:
+        return list(self)
+
+    def __repr__(self) -> str:
+        shown = ", ".join(str(rev) for rev in self[:10])
+        return f"RevisionArray([{shown}{', ...' if len(self) > 10 else ''}], length={len(self)})"
+
+    # ---- ordering ----
+
+    def argsort(self) -> np.ndarray:
+        # Stable, so equal revisions keep their original order
+        return np.argsort(self._keys, kind="stable")
+
+    def sorted(self, reverse: bool = False) -> RevisionArray:
+        keys = np.sort(self._keys, kind="stable")
+        return RevisionArray.from_keys(keys[::-1] if reverse else keys)
+
+    def argmax(self) -> int:
+        return int(np.argmax(self._keys))
+
+    def argmin(self) -> int:
+        return int(np.argmin(self._keys))
+
+    def max(self) -> Revision | SAPRevision:
+        return decode_revision(int(self._keys.max()))
+
+    def min(self) -> Revision | SAPRevision:
+        return decode_revision(int(self._keys.min()))
+
+    def unique(self) -> RevisionArray:
+        return RevisionArray.from_keys(np.unique(self._keys))
+
+    def group_max(self, groups: Sequence[Hashable] | np.ndarray) -> Dict[Any, Revision | SAPRevision]:
+        """
+        Newest revision per group, e.g. per part number. `groups` has one label per revision.
+        """
+        labels, inverse = np.unique(np.asarray(groups), return_inverse=True)
+        if len(labels) == 0:
+            return {}
+        newest = np.full(len(labels), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(newest, inverse.ravel(), self._keys)
+        return {label: decode_revision(key) for label, key in zip(labels.tolist(), newest.tolist())}
+
+    # ---- comparisons ----
+
+    @staticmethod
+    def _other_keys(other: Any) -> Any:
+        if isinstance(other, RevisionArray):
+            return other._keys
+        if isinstance(other, (str, int, float, bytes, BaseRevision)):
+            return parse_revision(other)._sort_key
+        raise TypeError(f"Can not compare RevisionArray with {type(other)}")
+
+    def __eq__(self, other: object) -> np.ndarray:  # type: ignore[override]
+        return self._keys == self._other_keys(other)
+
+    def __ne__(self, other: object) -> np.ndarray:  # type: ignore[override]
+        return self._keys != self._other_keys(other)
+
+    def __lt__(self, other: Any) -> np.ndarray:
+        return self._keys < self._other_keys(other)
+
+    def __le__(self, other: Any) -> np.ndarray:
+        return self._keys <= self._other_keys(other)
+
+    def __gt__(self, other: Any) -> np.ndarray:
+        return self._keys > self._other_keys(other)
+
+    def __ge__(self, other: Any) -> np.ndarray:
+        return self._keys >= self._other_keys(other)
+
+    # Comparisons return arrays, so instances can not be dict keys
+    __hash__ = None  # type: ignore[assignment]
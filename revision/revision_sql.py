@@ -0,0 +1,42 @@
+"""
+Store revisions as integers (see encode_revision) so the database can index and range-filter them.
+
+    class BoardRecord(Base):
+        __tablename__ = "BoardRecord"
+        PartNumber = Column(String(50), nullable=False)
+        Revision = Column(RevisionType, nullable=False)
+        __table_args__ = (Index("IX_BoardRecord_PartNumber_Revision", PartNumber, Revision),)
+
+    # Runs in the database as "Revision >= 1020100", using the index
+    session.query(BoardRecord).filter(BoardRecord.Revision >= "1.2a", BoardRecord.Revision < Revision("2.0"))
+
+Comparison operands are encoded by the column type, so they can be revision objects or anything parse_revision accepts.
+Plain integer ordering of the column orders the revisions, SAP revisions after DCI revisions.
+"""
+from __future__ import annotations
+from typing import Any
+from sqlalchemy import Integer
+from sqlalchemy.types import TypeDecorator
+from revision import Revision, SAPRevision, decode_revision, encode_revision
+
+
+class RevisionType(TypeDecorator):
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Any) -> int | None:
+        if value is None:
+            return None
+        return encode_revision(value)
+
+    def process_literal_param(self, value: Any, dialect: Any) -> str:
+        return "NULL" if value is None else str(encode_revision(value))
+
+    def process_result_value(self, value: int | None, dialect: Any) -> Revision | SAPRevision | None:
+        if value is None:
+            return None
+        return decode_revision(value)
+
+    @property
+    def python_type(self) -> type:
+        return Revision
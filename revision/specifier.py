@@ -0,0 +1,237 @@
+"""
+Revision constraints such as ">=1.2a,<2.0" and an index for checking many boards against them.
+
+Syntax:
+    clause        ==1.4   !=1.3b   >=1.2a   >1.2a   <=2.0   <2.0   1.4 (same as ==1.4)   * (anything)
+                  >, >=, < and <= only match revisions of the operand's scheme: >=1.2a matches no SAP revision
+    wildcard      1.2a.*  means 1.2a with any FA suffix (1.2a, 1.2a.A, 1.2a.B, ...)
+                  1.2.*   means 1.2 with any alpha and FA suffix
+                  Wildcards work with every operator: <1.2a.* is older than 1.2a, >1.2a.* is newer than every 1.2a.X
+    and           clauses separated by "," must all hold
+    or            groups separated by "||", either may hold
+
+A specifier is compiled into a sorted list of disjoint half-open ranges of revision sort keys, so membership is a binary
+search and whole RevisionArrays are checked with one np.searchsorted.
+"""
+from __future__ import annotations
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+from revision import _SAP_OFFSET, SAPRevision, parse_revision
+from revision_array import RevisionArray, RevisionLike
+import numpy as np
+
+Intervals = List[Tuple[int, int]]
+
+_MAX_KEY = 2 ** 62
+_OPERATORS = ("==", "!=", ">=", "<=", ">", "<")
+
+
+def _intersect(a: Intervals, b: Intervals) -> Intervals:
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if lo < hi:
+            result.append((lo, hi))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _union(a: Intervals, b: Intervals) -> Intervals:
+    result: Intervals = []
+    for lo, hi in sorted(a + b):
+        if result and lo <= result[-1][1]:
+            result[-1] = (result[-1][0], max(result[-1][1], hi))
+        else:
+            result.append((lo, hi))
+    return result
+
+
+def _complement(a: Intervals) -> Intervals:
+    result = []
+    start = 0
+    for lo, hi in a:
+        if start < lo:
+            result.append((start, lo))
+        start = hi
+    if start < _MAX_KEY:
+        result.append((start, _MAX_KEY))
+    return result
+
+
+def _key_range(text: str) -> Tuple[int, int]:
+    """
+    Keys matched by one revision, or by a wildcard like 1.2a.*
+    """
+    if not text.endswith(".*"):
+        key = parse_revision(text)._sort_key
+        return key, key + 1
+    rev = parse_revision(text[:-2])
+    if isinstance(rev, SAPRevision) or rev.FA is not None:
+        raise ValueError(f"Wildcard is only supported after MAJOR.MINOR or MAJOR.MINORalpha: {text}")
+    # alpha counts in hundreds and MINOR in ten thousands of the key, see Revision._set_fields
+    return rev._sort_key, rev._sort_key + (100 if rev.ALPHA else 10_000)
+
+
+def _family(key: int) -> Tuple[int, int]:
+    """
+    Keys of the revision scheme `key` belongs to. Legacy and SAP revisions do not order against each other, so
+    ">=1.2a" only covers legacy revisions and "<05" only SAP ones.
+    """
+    return (_SAP_OFFSET, _MAX_KEY) if key >= _SAP_OFFSET else (0, _SAP_OFFSET)
+
+
+def _clause(text: str) -> Intervals:
+    text = text.strip()
+    if text == "*":
+        return [(0, _MAX_KEY)]
+    operator = next((op for op in _OPERATORS if text.startswith(op)), "==")
+    lo, hi = _key_range(text[len(operator):].strip() if text.startswith(operator) else text)
+    if operator == "==":
+        return [(lo, hi)]
+    if operator == "!=":
+        return _complement([(lo, hi)])
+    family_lo, family_hi = _family(lo)
+    if operator == ">=":
+        return [(lo, family_hi)]
+    if operator == ">":
+        return [(hi, family_hi)] if hi < family_hi else []
+    if operator == "<=":
+        return [(family_lo, hi)]
+    return [(family_lo, lo)] if family_lo < lo else []
+
+
+class RevisionSpecifier:
+    __slots__ = ("text", "_intervals", "_bounds", "_bounds_list")
+
+    def __init__(self, text: str) -> None:
+        if not text or not text.strip():
+            raise ValueError("Revision specifier can not be empty")
+        intervals: Intervals = []
+        for group in text.split("||"):
+            group_intervals = [(0, _MAX_KEY)]
+            for clause in group.split(","):
+                if not clause.strip():
+                    raise ValueError(f"Empty clause in revision specifier {text!r}")
+                group_intervals = _intersect(group_intervals, _clause(clause))
+            intervals = _union(intervals, group_intervals)
+        self._set(text.strip(), intervals)
+
+    def _set(self, text: str, intervals: Intervals) -> None:
+        self.text = text
+        self._intervals = intervals
+        # [lo0, hi0, lo1, hi1, ...]: a key is inside iff an odd number of bounds are <= it
+        self._bounds_list = [bound for interval in intervals for bound in interval]
+        self._bounds = np.asarray(self._bounds_list, dtype=np.int64)
+
+    @property
+    def intervals(self) -> Intervals:
+        """
+        The matched sort keys as sorted, disjoint, half-open [lo, hi) ranges.
+        """
+        return list(self._intervals)
+
+    def contains(self, rev: RevisionLike) -> bool:
+        return bisect_right(self._bounds_list, parse_revision(rev)._sort_key) % 2 == 1
+
+    def __contains__(self, rev: RevisionLike) -> bool:
+        return self.contains(rev)
+
+    def filter(self, revisions: RevisionArray) -> np.ndarray:
+        """
+        Boolean mask of the revisions that satisfy this specifier.
+        """
+        return np.searchsorted(self._bounds, revisions.keys, side="right") % 2 == 1
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, RevisionSpecifier):
+            return self._intervals == other._intervals
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(tuple(self._intervals))
+
+    def __repr__(self) -> str:
+        return f"RevisionSpecifier({self.text!r})"
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@lru_cache(maxsize=1024)
+def parse_specifier(text: str) -> RevisionSpecifier:
+    return RevisionSpecifier(text)
+
+
+def _as_specifier(specifier: RevisionSpecifier | str) -> RevisionSpecifier:
+    return specifier if isinstance(specifier, RevisionSpecifier) else parse_specifier(specifier)
+
+
+class BoardIndex:
+    """
+    Boards (part number + revision) sorted by part number, then revision key.
+
+    Each part number owns a contiguous, key-sorted slice, so matching a specifier is one binary search per range
+    boundary: O(ranges * log boards) plus the size of the answer, however many boards there are.
+    """
+    def __init__(self, part_numbers: Sequence[str], revisions: RevisionArray | Iterable[RevisionLike]) -> None:
+        if not isinstance(revisions, RevisionArray):
+            revisions = RevisionArray(revisions)
+        parts = np.asarray(part_numbers)
+        if len(parts) != len(revisions):
+            raise ValueError(f"{len(parts)} part numbers for {len(revisions)} revisions")
+
+        labels, part_codes = np.unique(parts, return_inverse=True)
+        part_codes = part_codes.ravel()
+        # Board positions ordered by part, then revision
+        self._order = np.lexsort((revisions.keys, part_codes))
+        self._keys = revisions.keys[self._order]
+        sorted_codes = part_codes[self._order]
+        starts = np.searchsorted(sorted_codes, np.arange(len(labels)), side="left")
+        ends = np.searchsorted(sorted_codes, np.arange(len(labels)), side="right")
+        self._slices: Dict[str, Tuple[int, int]] = {
+            label: (int(start), int(end)) for label, start, end in zip(labels.tolist(), starts, ends)
+        }
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def _matching_ranges(self, part_number: str, specifier: RevisionSpecifier | str) -> List[Tuple[int, int]]:
+        start, end = self._slices.get(part_number, (0, 0))
+        keys = self._keys[start:end]
+        bounds = np.searchsorted(keys, _as_specifier(specifier)._bounds, side="left") + start
+        return [(int(bounds[i]), int(bounds[i + 1])) for i in range(0, len(bounds), 2) if bounds[i] < bounds[i + 1]]
+
+    def count(self, part_number: str, specifier: RevisionSpecifier | str) -> int:
+        """
+        Number of boards of this part number that satisfy the specifier, without materializing them.
+        """
+        return sum(hi - lo for lo, hi in self._matching_ranges(part_number, specifier))
+
+    def matching(self, part_number: str, specifier: RevisionSpecifier | str) -> np.ndarray:
+        """
+        Positions (in the order the boards were given) of the boards of this part number that satisfy the specifier.
+        """
+        ranges = self._matching_ranges(part_number, specifier)
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate([self._order[lo:hi] for lo, hi in ranges]))
+
+    def check(self, specifiers: Mapping[str, RevisionSpecifier | str], unconstrained: bool = True) -> np.ndarray:
+        """
+        Boolean mask over all boards: does each board satisfy the specifier for its part number?
+        Boards whose part number has no specifier get `unconstrained`.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        if unconstrained:
+            for part_number, (start, end) in self._slices.items():
+                if part_number not in specifiers:
+                    mask[self._order[start:end]] = True
+        for part_number, specifier in specifiers.items():
+            for lo, hi in self._matching_ranges(part_number, specifier):
+                mask[self._order[lo:hi]] = True
+        return mask
@@ -0,0 +1,32 @@
+from revision import parse_revision
+from revision_array import RevisionArray
+from specifier import RevisionSpecifier
+import pytest
+
+LEGACY = ["1.0", "1.2", "1.2a", "1.2a.A", "1.3", "2.0", "10.5b"]
+SAP = ["00", "05", "10", "99"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    (">=1.2a", ["1.2a", "1.2a.A", "1.3", "2.0", "10.5b"]),
+    (">1.2a", ["1.2a.A", "1.3", "2.0", "10.5b"]),
+    (">1.2a.*", ["1.3", "2.0", "10.5b"]),
+    ("<=1.2", ["1.0", "1.2"]),
+    ("<1.2", ["1.0"]),
+    (">=05", ["05", "10", "99"]),
+    ("<10", ["00", "05"]),
+    (">99", []),
+    ("<00", []),
+    ("!=1.2", ["1.0", "1.2a", "1.2a.A", "1.3", "2.0", "10.5b"] + SAP),
+    (">=1.2a,<2.0 || >=10", ["1.2a", "1.2a.A", "1.3", "10", "99"]),
+    ("*", LEGACY + SAP),
+])
+def test_ordering_stays_within_the_operand_family(text, expected):
+    specifier = RevisionSpecifier(text)
+    assert [rev for rev in LEGACY + SAP if rev in specifier] == expected
+    assert RevisionArray(LEGACY + SAP)[specifier.filter(RevisionArray(LEGACY + SAP))].tolist() == [parse_revision(rev) for rev in expected]
+
+
+def test_legacy_lower_bound_does_not_match_sap_revisions():
+    assert not any(rev in RevisionSpecifier(">=1.2a") for rev in SAP)
+    assert not any(rev in RevisionSpecifier("<05") for rev in LEGACY)
@@ -1,12 +1,40 @@
 from ui_layer import ProductScannerUI
 from data_access_layer import SqlProductRepository
-from domain_layer import ProductService
-from PyQt5.QtWidgets import QApplication
+from domain_layer import ProductService, ErpSerialLookup
+from lookup_cache import CachedSerialLookup
+from scan_journal import ScanJournal, JournalFlusher
+from serial_prefilter import PrefilteredSerialLookup, SerialBloomFilter
+from PyQt5.QtWidgets import QApplication, QMessageBox
+import os
+import sys
 
 
 DATABASE_URL = "mssql+pyodbc://@localhost\\SQLEXPRESS/DCIERP?driver=ODBC+Driver+17+for+SQL+Server"
+JOURNAL_PATH = "scan_journal.db"
+# Rebuilt with `python serial_prefilter.py build`; scanning works without it, just with an ERP call per typo
+KNOWN_SERIALS_PATH = "known_serials.bloom"
 
 app = QApplication([])
-window = ProductScannerUI(ProductService(SqlProductRepository(DATABASE_URL)))
+repository = SqlProductRepository(DATABASE_URL)
+try:
+    # Stop here with the migration to run, instead of failing every history read and every journal flush
+    repository.check_schema()
+except RuntimeError as e:
+    QMessageBox.critical(None, "Database not ready", str(e))
+    sys.exit(1)
+journal = ScanJournal(JOURNAL_PATH)
+flusher = JournalFlusher(journal, repository)
+flusher.start()
+
+lookup = ErpSerialLookup()
+if os.path.exists(KNOWN_SERIALS_PATH):
+    lookup = PrefilteredSerialLookup(lookup, SerialBloomFilter.open(KNOWN_SERIALS_PATH))
+
+service = ProductService(repository, CachedSerialLookup(lookup), journal)
+window = ProductScannerUI(service)
 window.show()
-app.exec_()
\ No newline at end of file
+app.exec_()
+service.close()
+# Whatever is not flushed yet stays in the journal and is pushed on the next start
+flusher.stop(timeout=10)
+journal.close()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Compare saving an assembly one product at a time against SqlProductRepository.add_assembly.
+Runs against a throwaway SQLite file, so no SQL Server is needed.
+
+    python benchmark_add_assembly.py --assemblies 200 --children 11
+"""
+from sqlalchemy import event
+from datetime import datetime, timezone
+from typing import List, Tuple
+from data_access_layer import Base, SqlProductRepository
+from domain_layer import Product
+import argparse
+import os
+import tempfile
+import time
+
+
+def make_assembly(index: int, number_of_children: int) -> Tuple[Product, List[Product]]:
+    date_stamp = datetime.now(timezone.utc)
+    parent = Product("PN-PARENT", f"P{index:09d}", "WO001", date_stamp, "bench")
+    children = [Product(f"PN-CHILD{i}", f"C{index:06d}{i:03d}", "WO001", date_stamp, "bench") for i in range(number_of_children)]
+    return parent, children
+
+
+def add_one_by_one(repository: SqlProductRepository, parent: Product, children: List[Product]) -> None:
+    parent_product_id = repository.add_product(parent)
+    for child in children:
+        child.parent_product_id = parent_product_id
+        repository.add_product(child)
+
+
+def add_as_assembly(repository: SqlProductRepository, parent: Product, children: List[Product]) -> None:
+    repository.add_assembly(parent, children)
+
+
+def run(name: str, add, number_of_assemblies: int, number_of_children: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repository = SqlProductRepository(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(repository.engine)
+
+        commits = 0
+
+        def count_commit(conn) -> None:
+            nonlocal commits
+            commits += 1
+
+        event.listen(repository.engine, "commit", count_commit)
+
+        latencies: List[float] = []
+        for index in range(number_of_assemblies):
+            parent, children = make_assembly(index, number_of_children)
+            start = time.perf_counter()
+            add(repository, parent, children)
+            latencies.append(time.perf_counter() - start)
+
+        repository.engine.dispose()
+
+    latencies.sort()
+    mean_ms = sum(latencies) / len(latencies) * 1000
+    p95_ms = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{name:<14} commits/assembly: {commits / number_of_assemblies:5.1f}   "
+          f"mean: {mean_ms:7.3f} ms   p95: {p95_ms:7.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assemblies", type=int, default=200)
+    parser.add_argument("--children", type=int, default=11, help="secondary assemblies per primary assembly")
+    args = parser.parse_args()
+
+    print(f"{args.assemblies} assemblies of 1 parent + {args.children} children")
+    run("add_product", add_one_by_one, args.assemblies, args.children)
+    run("add_assembly", add_as_assembly, args.assemblies, args.children)
@@ -0,0 +1,69 @@
+"""
+Hammer one SqlProductRepository from several threads, as the scanner UI workers do,
+and report throughput and failures. Runs against a throwaway file-backed SQLite database.
+
+    python benchmark_concurrency.py --threads 8 --assemblies 50 --pool-size 4
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List
+from data_access_layer import Base, SqlProductRepository
+from domain_layer import Product
+import argparse
+import os
+import tempfile
+import time
+
+
+def scan_assemblies(repository: SqlProductRepository, worker_id: int, number_of_assemblies: int, number_of_children: int) -> List[float]:
+    """
+    Save assemblies and read each parent back. Return the latency of every unit of work.
+    """
+    latencies: List[float] = []
+    for index in range(number_of_assemblies):
+        date_stamp = datetime.now(timezone.utc)
+        parent_serial = f"P{worker_id:03d}{index:06d}"
+        parent = Product("PN-PARENT", parent_serial, "WO001", date_stamp, "bench")
+        children = [Product(f"PN-CHILD{i}", f"{parent_serial}{i:02d}", "WO001", date_stamp, "bench") for i in range(number_of_children)]
+
+        start = time.perf_counter()
+        repository.add_assembly(parent, children)
+        if repository.query_product(parent_serial) is None:
+            raise RuntimeError(f"{parent_serial} was not saved")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--assemblies", type=int, default=50, help="assemblies per thread")
+    parser.add_argument("--children", type=int, default=11)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repository = SqlProductRepository(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}", pool_size=args.pool_size, max_overflow=0)
+        Base.metadata.create_all(repository.engine)
+
+        latencies: List[float] = []
+        failures: List[Exception] = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            futures = [executor.submit(scan_assemblies, repository, worker_id, args.assemblies, args.children) for worker_id in range(args.threads)]
+            for future in futures:
+                try:
+                    latencies.extend(future.result())
+                except Exception as e:
+                    failures.append(e)
+        elapsed = time.perf_counter() - start
+        repository.engine.dispose()
+
+    latencies.sort()
+    print(f"threads: {args.threads}   pool size: {args.pool_size}   assemblies: {len(latencies)}   failed threads: {len(failures)}")
+    if latencies:
+        print(f"throughput: {len(latencies) / elapsed:8.1f} assemblies/s   "
+              f"p50: {latencies[len(latencies) // 2] * 1000:7.2f} ms   "
+              f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.2f} ms")
+    for failure in failures:
+        print(f"  {type(failure).__name__}: {failure}")
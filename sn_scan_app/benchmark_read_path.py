@@ -0,0 +1,93 @@
+"""
+Compare ways of reading products for a work order: full ORM hydration of ProductHierarchy copied into Product
+(the old query_product path), Core column selects mapped into the slotted Product, and raw Core row tuples.
+Reports throughput and peak Python memory. Runs against a throwaway SQLite file.
+
+    python benchmark_read_path.py --rows 1000000
+"""
+from sqlalchemy import insert, select
+from datetime import datetime, timezone
+from typing import Any, Callable, List
+from data_access_layer import Base, PRODUCT_COLUMNS, ProductHierarchy, SqlProductRepository
+from domain_layer import Product
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+class DictProduct:
+    """
+    Product as it was before __slots__, for comparison.
+    """
+    def __init__(self, part_number: str, serial_number: str, work_order: str, date_stamp: datetime, employee: str, parent_product_id: int | None = None):
+        self.part_number = part_number
+        self.serial_number = serial_number
+        self.work_order = work_order
+        self.date_stamp = date_stamp
+        self.employee = employee
+        self.parent_product_id = parent_product_id
+
+
+def populate(repository: SqlProductRepository, number_of_rows: int, batch_size: int = 50000) -> None:
+    date_stamp = datetime.now(timezone.utc)
+    with repository.session_scope() as session:
+        for start in range(0, number_of_rows, batch_size):
+            session.execute(
+                insert(ProductHierarchy.__table__),
+                [
+                    dict(PartNumber=f"PN-{i % 50}", SerialNumber=f"{i:010d}", WorkOrder="WO001",
+                         DateStamp=date_stamp, Employee="bench", ParentProductID=None)
+                    for i in range(start, min(start + batch_size, number_of_rows))
+                ],
+            )
+
+
+def read_orm(repository: SqlProductRepository) -> List[Any]:
+    with repository.session_scope() as session:
+        return [
+            DictProduct(entry.part_number, entry.serial_number, entry.work_order, entry.date_stamp, entry.employee, entry.parent_product_id)
+            for entry in session.query(ProductHierarchy).filter_by(WorkOrder="WO001")
+        ]
+
+
+def read_core_product(repository: SqlProductRepository) -> List[Any]:
+    with repository.session_scope() as session:
+        return [Product(*row) for row in session.execute(select(*PRODUCT_COLUMNS).where(ProductHierarchy.WorkOrder == "WO001"))]
+
+
+def read_core_tuple(repository: SqlProductRepository) -> List[Any]:
+    with repository.session_scope() as session:
+        return [tuple(row) for row in session.execute(select(*PRODUCT_COLUMNS).where(ProductHierarchy.WorkOrder == "WO001"))]
+
+
+def run(name: str, read: Callable[[SqlProductRepository], List[Any]], repository: SqlProductRepository) -> None:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    products = read(repository)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(products)
+    del products
+    # tracemalloc slows allocation-heavy code down, so compare the timings with each other, not with production numbers
+    print(f"{name:<14} rows: {count:9d}   {count / elapsed:11.0f} rows/s   peak: {peak / 2 ** 20:8.1f} MiB   {peak / count:6.0f} B/row")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repository = SqlProductRepository(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(repository.engine)
+        populate(repository, args.rows)
+        print(f"{args.rows} rows")
+        run("orm", read_orm, repository)
+        run("core+Product", read_core_product, repository)
+        run("core tuples", read_core_tuple, repository)
+        repository.engine.dispose()
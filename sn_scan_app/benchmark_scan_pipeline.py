@@ -0,0 +1,156 @@
+"""
+Headless load and latency benchmark for the scan pipeline: no ERP, no SQL Server, no Qt.
+
+ProductService is wired to a fake querySN with configurable latency and to SqlProductRepository on a
+throwaway SQLite file. Synthetic ConfigMO / parent / child scan sessions are replayed at a configurable
+scan rate and per-scan latency is reported, broken out into lookup, commit and display time.
+
+    python benchmark_scan_pipeline.py --sessions 20 --assemblies 10 --children 5 --lookup-latency 0.02 --rate 50
+    python benchmark_scan_pipeline.py --cache --journal
+"""
+from collections import defaultdict
+from typing import Any, Dict, List
+from data_access_layer import Base, SqlProductRepository
+from domain_layer import ISerialLookup, ProductService
+from lookup_cache import CachedSerialLookup
+from scan_journal import JournalFlusher, ScanJournal
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+class FakeSerialLookup(ISerialLookup):
+    """
+    Stands in for the ERP. Every serial number is valid; work orders starting with "CMO" list `children` subassemblies.
+    """
+    def __init__(self, latency: float, jitter: float, children: int) -> None:
+        self._latency = latency
+        self._jitter = jitter
+        self._children = children
+        self.calls = 0
+
+    def lookup(self, serial_number: str) -> Dict[str, Any] | None:
+        self.calls += 1
+        time.sleep(max(0.0, random.gauss(self._latency, self._jitter)))
+        if serial_number.startswith("CMO"):
+            return {"SubAssemblies": {str(i): {"Description": f"Board {i}"} for i in range(self._children + 1)}}
+        return {
+            "ProductNumber": f"PN-{serial_number[:4]}",
+            "Description": "Synthetic board",
+            "Revision": "1.0a",
+            "SerialNumber": serial_number,
+        }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def replay(service: ProductService, sessions: int, assemblies: int, children: int, rate: float) -> Dict[str, List[float]]:
+    """
+    Drive the service the same way ProductScannerUI.start_workflow does. Return timings in seconds by stage.
+    A "scan" is one primary assembly with its children: validate every serial, commit, then look up what to display.
+    """
+    timings: Dict[str, List[float]] = defaultdict(list)
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_scan = time.perf_counter()
+    serial = 1000000000
+
+    for session_index in range(sessions):
+        work_order = f"CMO{session_index:06d}"
+        service.query_product_config(work_order)
+
+        for _ in range(assemblies):
+            # Pace scans at the requested rate, measured from when the scan was due
+            now = time.perf_counter()
+            if next_scan > now:
+                time.sleep(next_scan - now)
+            scan_start = max(next_scan, now)
+            next_scan = scan_start + interval
+
+            serial += 1
+            parent_serial = str(serial)
+            child_serials = []
+            for _ in range(children):
+                serial += 1
+                child_serials.append(str(serial))
+
+            start = time.perf_counter()
+            for serial_number in [parent_serial] + child_serials:
+                if not service.validate_serial_number(serial_number):
+                    raise RuntimeError(f"{serial_number} failed validation")
+            lookup_done = time.perf_counter()
+            service.add_assembly(parent_serial, child_serials, work_order)
+            commit_done = time.perf_counter()
+            for serial_number in [parent_serial] + child_serials:
+                service.query_product_info(serial_number)
+            display_done = time.perf_counter()
+
+            timings["lookup"].append(lookup_done - start)
+            timings["commit"].append(commit_done - lookup_done)
+            timings["display"].append(display_done - commit_done)
+            # Includes any time the scan spent queued behind a slower previous scan
+            timings["total"].append(display_done - scan_start)
+    return timings
+
+
+def report(timings: Dict[str, List[float]]) -> None:
+    print(f"{'stage':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage in ("lookup", "commit", "display", "total"):
+        values = sorted(timings[stage])
+        print(f"{stage:<8} "
+              f"{percentile(values, 0.50) * 1000:9.2f} "
+              f"{percentile(values, 0.95) * 1000:9.2f} "
+              f"{percentile(values, 0.99) * 1000:9.2f} "
+              f"{values[-1] * 1000 if values else 0.0:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="ConfigMO sessions to replay")
+    parser.add_argument("--assemblies", type=int, default=10, help="primary assemblies scanned per session")
+    parser.add_argument("--children", type=int, default=5, help="secondary assemblies per primary assembly")
+    parser.add_argument("--rate", type=float, default=0.0, help="scans per second, 0 for as fast as possible")
+    parser.add_argument("--lookup-latency", type=float, default=0.02, help="mean fake querySN latency in seconds")
+    parser.add_argument("--lookup-jitter", type=float, default=0.005, help="standard deviation of the fake querySN latency")
+    parser.add_argument("--cache", action="store_true", help="put CachedSerialLookup in front of the fake ERP")
+    parser.add_argument("--journal", action="store_true", help="write through the local scan journal")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # ProductService records the operator login, and os.getlogin() fails without a controlling terminal
+    os.getlogin = lambda: "bench"  # type: ignore
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repository = SqlProductRepository(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(repository.engine)
+        erp = FakeSerialLookup(args.lookup_latency, args.lookup_jitter, args.children)
+        lookup: ISerialLookup = CachedSerialLookup(erp) if args.cache else erp
+
+        journal = ScanJournal(os.path.join(tmp_dir, "journal.db")) if args.journal else None
+        flusher = JournalFlusher(journal, repository) if journal is not None else None
+        if flusher is not None:
+            flusher.start()
+
+        service = ProductService(repository, lookup, journal)
+        start = time.perf_counter()
+        timings = replay(service, args.sessions, args.assemblies, args.children, args.rate)
+        elapsed = time.perf_counter() - start
+        service.close()
+
+        if flusher is not None and journal is not None:
+            while journal.backlog():
+                time.sleep(0.05)
+            flusher.stop()
+            journal.close()
+        repository.engine.dispose()
+
+    scans = len(timings["total"])
+    print(f"{scans} scans in {elapsed:.2f} s ({scans / elapsed:.1f} scans/s), {erp.calls} ERP calls ({erp.calls / scans:.1f} per scan)")
+    report(timings)
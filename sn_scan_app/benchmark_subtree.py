@@ -0,0 +1,88 @@
+"""
+Compare loading a whole assembly hierarchy through the lazy ProductHierarchy.children relationship (N+1 queries)
+against SqlProductRepository.get_subtree (one recursive CTE). Runs against a throwaway SQLite file.
+
+    python benchmark_subtree.py --depth 6 --fanout 4
+"""
+from sqlalchemy import event, insert
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from data_access_layer import Base, ProductHierarchy, SqlProductRepository
+import argparse
+import os
+import tempfile
+import time
+
+
+def build_hierarchy(repository: SqlProductRepository, depth: int, fanout: int) -> int:
+    """
+    Insert one root with `fanout` children per node down to `depth` levels. Return the number of rows.
+    """
+    date_stamp = datetime.now(timezone.utc)
+    rows: List[Dict[str, Any]] = []
+    level = [1]
+    rows.append(dict(ProductID=1, PartNumber="PN-0", SerialNumber="ROOT", WorkOrder="WO001",
+                     DateStamp=date_stamp, Employee="bench", ParentProductID=None))
+    for d in range(1, depth):
+        next_level = []
+        for parent_id in level:
+            for _ in range(fanout):
+                product_id = len(rows) + 1
+                rows.append(dict(ProductID=product_id, PartNumber=f"PN-{d}", SerialNumber=f"S{product_id:09d}",
+                                 WorkOrder="WO001", DateStamp=date_stamp, Employee="bench", ParentProductID=parent_id))
+                next_level.append(product_id)
+        level = next_level
+    with repository.session_scope() as session:
+        session.execute(insert(ProductHierarchy.__table__), rows)
+    return len(rows)
+
+
+def load_lazily(repository: SqlProductRepository, serial_number: str) -> int:
+    with repository.session_scope() as session:
+        root = (session.query(ProductHierarchy)
+                .filter_by(SerialNumber=serial_number)
+                .order_by(ProductHierarchy.DateStamp.desc())
+                .first())
+        count = 0
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+    return count
+
+
+def load_subtree(repository: SqlProductRepository, serial_number: str) -> int:
+    subtree = repository.get_subtree(serial_number)
+    return len(subtree) if subtree else 0
+
+
+def run(name: str, load, repository: SqlProductRepository) -> None:
+    statements = 0
+
+    def count_statement(*args: Any) -> None:
+        nonlocal statements
+        statements += 1
+
+    event.listen(repository.engine, "before_cursor_execute", count_statement)
+    start = time.perf_counter()
+    count = load(repository, "ROOT")
+    elapsed = time.perf_counter() - start
+    event.remove(repository.engine, "before_cursor_execute", count_statement)
+    print(f"{name:<12} rows: {count:7d}   queries: {statements:7d}   time: {elapsed * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fanout", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repository = SqlProductRepository(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(repository.engine)
+        total = build_hierarchy(repository, args.depth, args.fanout)
+        print(f"{total} products, depth {args.depth}, fanout {args.fanout}")
+        run("lazy", load_lazily, repository)
+        run("get_subtree", load_subtree, repository)
+        repository.engine.dispose()
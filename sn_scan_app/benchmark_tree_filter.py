@@ -0,0 +1,55 @@
+"""
+Time the search box filter on a large ProductTreeModel under an offscreen QTreeView.
+
+"model" is set_filter_text() itself; "view" is the relayout the view does on the next event loop pass.
+
+    python benchmark_tree_filter.py --assemblies 10000 --children 9
+"""
+from PyQt5.QtCore import QThreadPool
+from PyQt5.QtWidgets import QApplication, QTreeView
+from domain_layer import ProductDisplayInfo
+from product_tree_model import ProductTreeModel
+import argparse
+import os
+import time
+
+QUERIES = ["4", "40", "400", "4000", "40000", "400000", "4000000", "", "4000123", "4001", ""]
+
+
+def board(serial_number: str) -> ProductDisplayInfo:
+    return ProductDisplayInfo(description="Board", part_number="PN-1", revision="A", serial_number=serial_number)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assemblies", type=int, default=10000)
+    parser.add_argument("--children", type=int, default=9)
+    parser.add_argument("--expanded", type=int, default=50, help="assemblies expanded in the view")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication([])
+    model = ProductTreeModel(lambda work_order, before, limit: None, QThreadPool.globalInstance())
+    stride = args.children + 1
+    for a in range(args.assemblies):
+        serial_number = 4000000 + a * stride
+        model.add_assembly(board(str(serial_number)), [board(str(serial_number + i + 1)) for i in range(args.children)])
+
+    view = QTreeView()
+    view.setUniformRowHeights(True)
+    view.setModel(model)
+    view.resize(800, 600)
+    view.show()
+    for row in range(min(args.expanded, model.rowCount())):
+        view.expand(model.index(row, 0))
+    app.processEvents()
+
+    print(f"{model.node_count()} nodes")
+    for query in QUERIES:
+        start = time.perf_counter()
+        model.set_filter_text(query)
+        filtered = time.perf_counter()
+        app.processEvents()
+        done = time.perf_counter()
+        print(f"{query!r:>11}  model {(filtered - start) * 1000:7.1f} ms   view {(done - filtered) * 1000:7.1f} ms   "
+              f"top level rows {model.rowCount():6d}")
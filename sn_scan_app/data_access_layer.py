@@ -1,10 +1,15 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import create_engine, inspect, insert, select, func, literal_column, Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker, joinedload
+from sqlalchemy.orm import relationship, sessionmaker, joinedload, aliased, Session
+from sqlalchemy.pool import QueuePool, StaticPool
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timezone
-from typing import Optional, Any, Dict
-from domain_layer import IProductRepository, Product
+from typing import Optional, Any, Dict, List, Iterator, Iterable, Set, Tuple
+from domain_layer import IProductRepository, Product, ProductSubtree, RejectedWriteError
 import pyodbc
+import threading
 
 Base = declarative_base()
 
@@ -18,8 +23,18 @@ class ProductHierarchy(Base):
     DateStamp = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
     Employee = Column(String(20), nullable=False)
     ParentProductID = Column(Integer, ForeignKey("mfgProductHierarchy.ProductID"), nullable=True)
+    # Scan journal entry a primary assembly was written from; NULL for children and for direct writes
+    IdempotencyKey = Column(String(32), nullable=True)
     
     parent = relationship("ProductHierarchy", remote_side=[ProductID], backref="children")
+
+    # Serves "latest entry for a serial number" lookups without a sort. Created on SQL Server by migrations/0001_serial_number_date_stamp_index.sql
+    # The idempotency key column and its index come from migrations/0002_idempotency_key.sql
+    __table_args__ = (
+        Index("IX_mfgProductHierarchy_SerialNumber_DateStamp", SerialNumber, DateStamp.desc()),
+        Index("UX_mfgProductHierarchy_IdempotencyKey", IdempotencyKey, unique=True,
+              mssql_where=IdempotencyKey.isnot(None), sqlite_where=IdempotencyKey.isnot(None)),
+    )
     
     def __repr__(self):
         return (
@@ -59,12 +74,90 @@ class ProductHierarchy(Base):
         return self.ParentProductID
 
 
+# Columns in Product constructor order, for reads that map rows straight into Product(*row)
+PRODUCT_COLUMNS = (
+    ProductHierarchy.PartNumber,
+    ProductHierarchy.SerialNumber,
+    ProductHierarchy.WorkOrder,
+    ProductHierarchy.DateStamp,
+    ProductHierarchy.Employee,
+    ProductHierarchy.ParentProductID,
+)
+
+
 class SqlProductRepository(IProductRepository):
-    def __init__(self, connection_string: str):
-        engine = create_engine(connection_string)
-        Session = sessionmaker(engine)
-        self.session = Session()
+    QUERY_CHUNK_SIZE = 1000
+    # (column, index, script) the model maps but the original mfgProductHierarchy does not have
+    REQUIRED_MIGRATIONS = (
+        ("IdempotencyKey", "UX_mfgProductHierarchy_IdempotencyKey", "migrations/0002_idempotency_key.sql"),
+    )
+
+    def __init__(self,
+                 connection_string: str,
+                 pool_size: int = 5,
+                 max_overflow: int = 10,
+                 pool_pre_ping: bool = True,
+                 pool_recycle: int = 1800):
+        """
+        :param connection_string: SQLAlchemy database URL
+        :param pool_size: connections kept open in the pool
+        :param max_overflow: extra connections allowed on top of pool_size under load
+        :param pool_pre_ping: test a connection before handing it out, so a dropped server connection is replaced instead of failing the scan
+        :param pool_recycle: seconds after which a connection is closed and reopened
+        """
+        url = make_url(connection_string)
+        engine_options: Dict[str, Any] = {"pool_pre_ping": pool_pre_ping, "pool_recycle": pool_recycle}
+        if url.drivername == "mssql+pyodbc":
+            # Send executemany() parameter sets to the server in one round trip instead of one per row
+            engine_options["fast_executemany"] = True
+        # Held for the whole of each session when all threads share a single connection
+        self._connection_lock: Any = nullcontext()
+        if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+            # An in-memory database only exists on its own connection, so every thread has to share that one connection.
+            # Sessions take turns on it; interleaved, one thread's commit would end another's transaction
+            engine_options.update(poolclass=StaticPool, connect_args={"check_same_thread": False})
+            self._connection_lock = threading.RLock()
+        else:
+            engine_options.update(poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow)
+            if url.get_backend_name() == "sqlite":
+                # Pooled SQLite connections are handed to whichever thread checks them out
+                engine_options["connect_args"] = {"check_same_thread": False}
+        self.engine = create_engine(url, **engine_options)
+        # Objects stay readable after the session that loaded them is closed
+        self._session_factory = sessionmaker(self.engine, expire_on_commit=False)
+
+    @contextmanager
+    def session_scope(self) -> Iterator[Session]:
+        """
+        One unit of work: commit on success, roll back on any exception, always return the connection to the pool.
+        Every call gets its own session, so the repository can be used from several threads.
+        """
+        with self._connection_lock:
+            session = self._session_factory()
+            try:
+                yield session
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
         
+    def check_schema(self) -> None:
+        """
+        Raise RuntimeError naming the migration to apply if the database lacks a column or index the model maps.
+        Every ORM statement on mfgProductHierarchy lists the mapped columns, so a missing one breaks all of them.
+        """
+        inspector = inspect(self.engine)
+        table = ProductHierarchy.__tablename__
+        if not inspector.has_table(table):
+            raise RuntimeError(f"Table {table} does not exist")
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        indexes = {index["name"] for index in inspector.get_indexes(table)}
+        for column, index, script in self.REQUIRED_MIGRATIONS:
+            if column not in columns or index not in indexes:
+                raise RuntimeError(f"{table} has no {column if column not in columns else index}; apply {script} to the database before starting the app")
+
     def add_product(self, product: Product) -> int:
         new_product = ProductHierarchy(
             PartNumber=product.part_number,
@@ -75,18 +168,207 @@ class SqlProductRepository(IProductRepository):
             ParentProductID=product.parent_product_id 
         ) 
         
-        self.session.add(new_product)
-        self.session.commit()
+        with self.session_scope() as session:
+            session.add(new_product)
         
         return new_product.product_id
+
+    def add_assembly(self, parent: Product, children: List[Product]) -> int:
+        return self.add_assemblies([(parent, children)])[0]
+
+    def add_assemblies(self, assemblies: List[Tuple[Product, List[Product]]], idempotency_keys: List[str] | None = None) -> List[int]:
+        try:
+            return self._add_assemblies(assemblies, idempotency_keys)
+        except (DataError, IntegrityError) as e:
+            # e.g. "String or binary data would be truncated": the same rows will never go in
+            raise RejectedWriteError(str(e)) from e
+
+    def _add_assemblies(self, assemblies: List[Tuple[Product, List[Product]]], idempotency_keys: List[str] | None) -> List[int]:
+        keys: List[str | None] = list(idempotency_keys) if idempotency_keys is not None else [None] * len(assemblies)
+        parent_entries = [
+            ProductHierarchy(
+                PartNumber=parent.part_number,
+                SerialNumber=parent.serial_number,
+                WorkOrder=parent.work_order,
+                DateStamp=parent.date_stamp,
+                Employee=parent.employee,
+                ParentProductID=parent.parent_product_id,
+                IdempotencyKey=key
+            )
+            for (parent, _), key in zip(assemblies, keys)
+        ]
+        with self.session_scope() as session:
+            session.add_all(parent_entries)
+            # Flush to get the parents' ProductIDs without committing
+            session.flush()
+            child_rows = [
+                {
+                    "PartNumber": child.part_number,
+                    "SerialNumber": child.serial_number,
+                    "WorkOrder": child.work_order,
+                    "DateStamp": child.date_stamp,
+                    "Employee": child.employee,
+                    "ParentProductID": parent_entry.ProductID,
+                }
+                for parent_entry, (_, children) in zip(parent_entries, assemblies)
+                for child in children
+            ]
+            if child_rows:
+                session.execute(insert(ProductHierarchy.__table__), child_rows)
+
+        return [parent_entry.product_id for parent_entry in parent_entries]
         
+    def written_keys(self, idempotency_keys: Iterable[str]) -> Set[str]:
+        idempotency_keys = list(dict.fromkeys(idempotency_keys))
+        written: Set[str] = set()
+        with self.session_scope() as session:
+            for start in range(0, len(idempotency_keys), self.QUERY_CHUNK_SIZE):
+                query = select(ProductHierarchy.IdempotencyKey).where(
+                    ProductHierarchy.IdempotencyKey.in_(idempotency_keys[start:start + self.QUERY_CHUNK_SIZE]))
+                written.update(session.execute(query).scalars())
+        return written
+
     def query_product(self, serial_number: str) -> Product | None:
-        product_entry = self.session.query(ProductHierarchy).filter_by(SerialNumber=serial_number).order_by(ProductHierarchy.DateStamp.desc()).first()
-        if product_entry:
-            return Product(product_entry.part_number, product_entry.serial_number, product_entry.work_order, product_entry.date_stamp, product_entry.employee, product_entry.parent_product_id) 
+        # Core select of just the Product columns: no ORM entity, identity map or relationship bookkeeping
+        query = (
+            select(*PRODUCT_COLUMNS)
+            .where(ProductHierarchy.SerialNumber == serial_number)
+            .order_by(ProductHierarchy.DateStamp.desc())
+            .limit(1)
+        )
+        with self.session_scope() as session:
+            row = session.execute(query).first()
+        if row:
+            return Product(*row)
         else:
             return None
         
+    def query_products(self, serial_numbers: Iterable[str]) -> Dict[str, Product]:
+        serial_numbers = list(dict.fromkeys(serial_numbers))
+        products: Dict[str, Product] = {}
+        with self.session_scope() as session:
+            # SQL Server accepts at most 2100 parameters per statement
+            for start in range(0, len(serial_numbers), self.QUERY_CHUNK_SIZE):
+                ranked = (
+                    select(
+                        *PRODUCT_COLUMNS,
+                        func.row_number().over(
+                            partition_by=ProductHierarchy.SerialNumber,
+                            order_by=ProductHierarchy.DateStamp.desc(),
+                        ).label("RowNumber"),
+                    )
+                    .where(ProductHierarchy.SerialNumber.in_(serial_numbers[start:start + self.QUERY_CHUNK_SIZE]))
+                    .subquery()
+                )
+                latest = select(*(ranked.c[column.key] for column in PRODUCT_COLUMNS)).where(ranked.c.RowNumber == 1)
+                for row in session.execute(latest):
+                    products[row.SerialNumber] = Product(*row)
+        return products
+
+    def iter_work_order(self, work_order: str, batch_size: int = 10000) -> Iterator[List[Tuple[Any, ...]]]:
+        parent = aliased(ProductHierarchy)
+        query = (
+            select(
+                ProductHierarchy.ProductID,
+                ProductHierarchy.ParentProductID,
+                parent.SerialNumber.label("ParentSerialNumber"),
+                ProductHierarchy.PartNumber,
+                ProductHierarchy.SerialNumber,
+                ProductHierarchy.WorkOrder,
+                ProductHierarchy.DateStamp,
+                ProductHierarchy.Employee,
+            )
+            .outerjoin(parent, ProductHierarchy.ParentProductID == parent.ProductID)
+            .where(ProductHierarchy.WorkOrder == work_order)
+            .order_by(ProductHierarchy.ProductID)
+            # Server-side cursor: rows are fetched batch_size at a time instead of all at once
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        with self.session_scope() as session:
+            for partition in session.execute(query).partitions():
+                yield [tuple(row) for row in partition]
+
+    def get_subtree(self, serial_number: str, max_depth: int = 100) -> ProductSubtree | None:
+        root_id = (
+            select(ProductHierarchy.ProductID)
+            .where(ProductHierarchy.SerialNumber == serial_number)
+            .order_by(ProductHierarchy.DateStamp.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        with self.session_scope() as session:
+            rows = self._subtree_rows(session, ProductHierarchy.ProductID == root_id, max_depth)
+        if not rows:
+            return None
+        return self._to_subtree(rows)
+
+    def get_work_order_history(self, work_order: str, before_product_id: int | None, limit: int, max_depth: int = 100) -> ProductSubtree:
+        root_ids = (
+            select(ProductHierarchy.ProductID)
+            .where(ProductHierarchy.WorkOrder == work_order, ProductHierarchy.ParentProductID.is_(None))
+            .order_by(ProductHierarchy.ProductID.desc())
+            .limit(limit)
+        )
+        if before_product_id is not None:
+            root_ids = root_ids.where(ProductHierarchy.ProductID < before_product_id)
+        with self.session_scope() as session:
+            page = session.execute(root_ids).scalars().all()
+            rows = self._subtree_rows(session, ProductHierarchy.ProductID.in_(page), max_depth) if page else []
+        # Newest assembly first; the roots are the leading Depth 0 block
+        number_of_roots = len(page)
+        return self._to_subtree(rows[:number_of_roots][::-1] + rows[number_of_roots:])
+
+    @staticmethod
+    def _subtree_rows(session: Session, anchor: Any, max_depth: int) -> List[Any]:
+        """
+        Rows matching `anchor` and all of their descendants, from one recursive CTE. Ordered by depth, then ProductID.
+        """
+        columns = (
+            ProductHierarchy.ProductID,
+            ProductHierarchy.ParentProductID,
+            ProductHierarchy.PartNumber,
+            ProductHierarchy.SerialNumber,
+            ProductHierarchy.WorkOrder,
+            ProductHierarchy.DateStamp,
+            ProductHierarchy.Employee,
+        )
+        tree = (
+            select(*columns, literal_column("0").label("Depth"))
+            .where(anchor)
+            .cte("tree", recursive=True)
+        )
+        child = aliased(ProductHierarchy)
+        tree = tree.union_all(
+            select(
+                child.ProductID,
+                child.ParentProductID,
+                child.PartNumber,
+                child.SerialNumber,
+                child.WorkOrder,
+                child.DateStamp,
+                child.Employee,
+                tree.c.Depth + 1,
+            )
+            # max_depth also guards against a cycle in the parent links
+            .where(child.ParentProductID == tree.c.ProductID, tree.c.Depth < max_depth)
+        )
+        return list(session.execute(select(tree).order_by(tree.c.Depth, tree.c.ProductID)).all())
+
+    @staticmethod
+    def _to_subtree(rows: List[Any]) -> ProductSubtree:
+        subtree = ProductSubtree([], [], [], [], [], [], [])
+        row_of: Dict[int, int] = {}
+        for product_id, parent_product_id, part_number, serial, work_order, date_stamp, employee, _ in rows:
+            subtree.parent_index.append(row_of.get(parent_product_id, -1))
+            row_of[product_id] = len(subtree.product_id)
+            subtree.product_id.append(product_id)
+            subtree.part_number.append(part_number)
+            subtree.serial_number.append(serial)
+            subtree.work_order.append(work_order)
+            subtree.date_stamp.append(date_stamp)
+            subtree.employee.append(employee)
+        return subtree
+        
 
 if __name__ == '__main__':
     server = 'localhost\\SQLEXPRESS'
@@ -1,12 +1,134 @@
 from datetime import datetime, timezone
 from abc import ABC, abstractmethod 
 from interface.gpLookup import querySN  # type: ignore
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Iterable, Iterator, Set, Tuple
 from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 import os
+import queue
+import threading
+import time
+
+
+# How often queued lookups are checked for having started, so their timeout can begin
+QUEUED_LOOKUP_POLL = 0.05
+
+
+class RejectedWriteError(Exception):
+    """
+    The database refused the data itself (e.g. a value longer than its column), so retrying the same write will fail again.
+    """
+
+
+class _TimedFuture(Future):
+    # time.monotonic() when a worker picked the call up; None while it is still queued
+    started: float | None = None
+
+
+class _DaemonThreadPool:
+    """
+    Daemon worker threads. Unlike ThreadPoolExecutor, a call that never returns (a querySN stuck on the network)
+    does not keep the interpreter from exiting. A caller that gives up on a running call abandons it: up to
+    max_abandoned replacement workers are started, so hung calls do not use up the pool.
+    """
+    def __init__(self, max_workers: int, thread_name_prefix: str, max_abandoned: int | None = None) -> None:
+        self._tasks: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._max_workers = max_workers
+        self._max_abandoned = max_workers if max_abandoned is None else max_abandoned
+        self._thread_name_prefix = thread_name_prefix
+        self._started_threads = 0
+        # Running calls nobody waits for any more, and the subset whose worker has been replaced
+        self._abandoned: Set[Future] = set()
+        self._replaced: Set[Future] = set()
+        for _ in range(max_workers):
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        thread = threading.Thread(target=self._work, name=f"{self._thread_name_prefix}_{self._started_threads}", daemon=True)
+        self._started_threads += 1
+        thread.start()
+
+    def _work(self) -> None:
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            future.started = time.monotonic()
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            with self._lock:
+                self._abandoned.discard(future)
+                if future in self._replaced:
+                    # Another worker has taken this one's place
+                    self._replaced.discard(future)
+                    return
+
+    def submit(self, fn: Any, *args: Any) -> _TimedFuture:
+        future = _TimedFuture()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The thread pool has been closed")
+            self._tasks.put((future, fn, args))
+        return future
+
+    def abandon(self, future: _TimedFuture) -> None:
+        """
+        Stop waiting for a call. A queued call is cancelled; a running one is left to finish on its own.
+        """
+        if future.cancel():
+            return
+        with self._lock:
+            if future.done() or future in self._abandoned:
+                return
+            self._abandoned.add(future)
+            if not self._closed and len(self._replaced) < self._max_abandoned:
+                self._replaced.add(future)
+                self._start_worker()
+
+    @property
+    def hung(self) -> int:
+        """Abandoned calls that are still running."""
+        with self._lock:
+            return len(self._abandoned)
+
+    @property
+    def exhausted(self) -> bool:
+        """Every worker is stuck in an abandoned call, so nothing queued will start."""
+        with self._lock:
+            return len(self._abandoned) >= self._max_workers + len(self._replaced)
+
+    def close(self) -> None:
+        """
+        Cancel the calls that have not started and let each worker exit once its current call returns. Does not wait.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while True:
+                try:
+                    task = self._tasks.get_nowait()
+                except queue.Empty:
+                    break
+                task[0].cancel()
+            # Replaced workers exit by themselves after their abandoned call
+            for _ in range(self._max_workers):
+                self._tasks.put(None)
 
 
 class Product:
+    # No per-instance __dict__: history views and exports create these by the million
+    __slots__ = ("part_number", "serial_number", "work_order", "date_stamp", "employee", "parent_product_id")
+
     def __init__(self, part_number: str, serial_number: str, work_order: str, date_stamp: datetime, employee: str, parent_product_id: int | None = None):
         self.part_number =  part_number
         self.serial_number = serial_number  
@@ -24,21 +146,127 @@ class ProductDisplayInfo:
     serial_number: str
 
 
+@dataclass
+class SerialLookupResult:
+    serial_number: str
+    valid: bool
+    info: ProductDisplayInfo | None = None
+    error: str | None = None
+
+
+@dataclass
+class ProductSubtree:
+    """
+    One or more products and every product below them, flattened into columns.
+    parent_index[i] is the row of row i's parent, or -1 for a root. Parents always come before their children.
+    A single subtree has exactly one root, at row 0.
+    """
+    parent_index: List[int]
+    product_id: List[int]
+    part_number: List[str]
+    serial_number: List[str]
+    work_order: List[str]
+    date_stamp: List[datetime]
+    employee: List[str]
+
+    def __len__(self) -> int:
+        return len(self.product_id)
+
+    def children_of(self, row: int) -> List[int]:
+        return [i for i, parent in enumerate(self.parent_index) if parent == row]
+
+
+class ISerialLookup(ABC):
+    @abstractmethod
+    def lookup(self, serial_number: str) -> Dict[str, Any] | None:
+        """
+        Look up a serial number (or ConfigMO) in the ERP.
+        :param serial_number: serial number or work order to look up
+        :return: the ERP record, or None if the ERP does not know the serial number
+        """
+        pass
+
+
+class ErpSerialLookup(ISerialLookup):
+    def lookup(self, serial_number: str) -> Dict[str, Any] | None:
+        return querySN(serial_number) or None   # type: ignore
+
+
+class IScanJournal(ABC):
+    @abstractmethod
+    def append(self, parent: Product, children: List[Product]) -> str:
+        """
+        Durably record an assembly that still has to be written to the product repository.
+        :return: the idempotency key of the journal entry
+        """
+        pass
+
+    @abstractmethod
+    def backlog(self) -> int:
+        """Number of assemblies recorded but not yet written to the product repository."""
+        pass
+
+    @abstractmethod
+    def parked_count(self) -> int:
+        """Number of those assemblies set aside because the product repository rejected them."""
+        pass
+
+
 class IProductRepository(ABC):
     @abstractmethod
     def query_product(self, serial_number: str) -> Product | None:
         """Retrieve a product by its serial number."""
         pass
     
+    @abstractmethod
+    def query_products(self, serial_numbers: Iterable[str]) -> Dict[str, Product]:
+        """Retrieve the latest entry for each serial number, keyed by serial number. Unknown serial numbers are left out."""
+        pass
+
     @abstractmethod
     def add_product(self, product: Product) -> int:
         """Save a product to the database"""
         pass
 
-    # @abstractmethod
-    # def get_children(self, parent_id: int):
-    #     """Retrieve all child products of a give parent product ID."""
-    #     pass 
+    @abstractmethod
+    def add_assembly(self, parent: Product, children: List[Product]) -> int:
+        """Save a parent product and all of its children in a single transaction. Return the parent's ID"""
+        pass
+
+    @abstractmethod
+    def add_assemblies(self, assemblies: List[Tuple[Product, List[Product]]], idempotency_keys: List[str] | None = None) -> List[int]:
+        """
+        Save several (parent, children) assemblies in a single transaction. Return the parents' IDs in order.
+        idempotency_keys, one per assembly, are stored with the parents; a key can only be written once.
+        Raises RejectedWriteError if the data itself was refused; any other error may go away on retry.
+        """
+        pass
+
+    @abstractmethod
+    def written_keys(self, idempotency_keys: Iterable[str]) -> Set[str]:
+        """Return the idempotency keys that have already been written."""
+        pass
+
+    @abstractmethod
+    def get_subtree(self, serial_number: str) -> ProductSubtree | None:
+        """Retrieve the latest entry for a serial number and all of its descendants, to any depth."""
+        pass
+
+    @abstractmethod
+    def iter_work_order(self, work_order: str, batch_size: int = 10000) -> Iterator[List[Tuple[Any, ...]]]:
+        """
+        Stream every entry scanned under a work order, in batches of rows, without loading the whole result.
+        Each row is (ProductID, ParentProductID, ParentSerialNumber, PartNumber, SerialNumber, WorkOrder, DateStamp, Employee).
+        """
+        pass
+
+    @abstractmethod
+    def get_work_order_history(self, work_order: str, before_product_id: int | None, limit: int) -> ProductSubtree:
+        """
+        Retrieve one page of primary assemblies scanned under a work order, newest first, with all of their descendants.
+        Pass the smallest root product_id of the previous page as before_product_id to get the next page.
+        """
+        pass
     
 
 class IProductService(ABC):
@@ -51,6 +279,28 @@ class IProductService(ABC):
         :return: an unique ID for the product entry 
         """
 
+    @abstractmethod
+    def add_assembly(self, parent_serial: str, child_serials: List[str], work_order: str) -> int | None:
+        """
+        Add a primary assembly and all of its secondary assemblies as one database transaction.
+        :param parent_serial: serial number of the primary assembly
+        :param child_serials: serial numbers of the secondary assemblies
+        :param work_order: the ConfigMO the assembly was built under
+        :return: the unique ID of the parent product entry, or None if the write was deferred to the scan journal
+        """
+
+    @abstractmethod
+    def pending_writes(self) -> int:
+        """
+        Return the number of assemblies waiting in the scan journal to be written to the database
+        """
+
+    @abstractmethod
+    def rejected_writes(self) -> int:
+        """
+        Return how many of those the database rejected. They stay in the scan journal until requeued.
+        """
+
     @abstractmethod
     def query_product_info(self, serial_number: str) -> ProductDisplayInfo | None:
         """
@@ -59,6 +309,16 @@ class IProductService(ABC):
         :return: product object
         """
 
+    @abstractmethod
+    def lookup_serial_numbers(self, serial_numbers: List[str], timeout: float = 10.0) -> Dict[str, SerialLookupResult]:
+        """
+        Validate and resolve several serial numbers concurrently.
+        :param serial_numbers: serial numbers to look up
+        :param timeout: seconds each lookup may run, counted from when it starts, before it is reported as an error
+        :return: one result per distinct serial number, keyed by serial number
+        """
+        pass
+
     @abstractmethod
     def validate_serial_number(self, serial_number: str) -> bool: 
         """
@@ -69,14 +329,23 @@ class IProductService(ABC):
         pass
 
 
-    # @abstractmethod
-    # def get_children(self, parent_serial: str) -> List[Product]:
-    #     """
-    #     Retrieves all children of a parent product by serial number
-    #     :param parent_serial
-    #     :return: A list of child products.
-    #     """
-    #     pass
+    @abstractmethod
+    def get_work_order_history(self, work_order: str, before_product_id: int | None, limit: int) -> ProductSubtree:
+        """
+        Retrieves one page of assemblies already scanned under a work order, newest first
+        :param before_product_id: smallest root product_id of the previous page, or None for the first page
+        :param limit: maximum number of primary assemblies in the page
+        """
+        pass
+
+    @abstractmethod
+    def get_subtree(self, parent_serial: str) -> ProductSubtree | None:
+        """
+        Retrieves a parent product and all of its descendants by serial number
+        :param parent_serial
+        :return: the flattened subtree, or None if the serial number was never scanned
+        """
+        pass
     
     # @abstractmethod
     # def find_number_of_children(self, parent_serial: str) -> int:
@@ -92,32 +361,110 @@ class IProductService(ABC):
         """
         pass
     
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Release the service's worker threads. Lookups still running are abandoned, not waited for.
+        """
+        pass
+
 
 class ProductService(IProductService):
-    def __init__(self, repository: IProductRepository) -> None:
+    def __init__(self, repository: IProductRepository, lookup: ISerialLookup | None = None, journal: IScanJournal | None = None, max_lookup_workers: int = 8) -> None:
         self.repository = repository       
+        self.serial_lookup = lookup if lookup is not None else ErpSerialLookup()
+        # Bounds how many querySN calls are in flight at once, not counting abandoned ones
+        self._lookup_pool = _DaemonThreadPool(max_lookup_workers, "querySN")
+        # With a journal, assemblies are written locally first and pushed to the repository in the background
+        self.journal = journal
         
     def add_product(self, serial_number: str, parent_product_id: int | None, work_order: str) -> int:
-        part_number = querySN(serial_number)['ProductNumber']   # type: ignore
+        part_number = self.serial_lookup.lookup(serial_number)['ProductNumber']   # type: ignore
         user = os.getlogin()
         new_product = Product(part_number, serial_number, work_order, datetime.now(timezone.utc), user, parent_product_id) # type: ignore
         return self.repository.add_product(new_product)
+
+    def add_assembly(self, parent_serial: str, child_serials: List[str], work_order: str) -> int | None:
+        user = os.getlogin()
+        date_stamp = datetime.now(timezone.utc)
+        parent = Product(self.serial_lookup.lookup(parent_serial)['ProductNumber'], parent_serial, work_order, date_stamp, user)  # type: ignore
+        children = [Product(self.serial_lookup.lookup(child_serial)['ProductNumber'], child_serial, work_order, date_stamp, user) for child_serial in child_serials]  # type: ignore
+        if self.journal is not None:
+            self.journal.append(parent, children)
+            return None
+        return self.repository.add_assembly(parent, children)
+
+    def close(self) -> None:
+        self._lookup_pool.close()
+
+    def pending_writes(self) -> int:
+        return self.journal.backlog() if self.journal is not None else 0
+
+    def rejected_writes(self) -> int:
+        return self.journal.parked_count() if self.journal is not None else 0
         
+    def get_subtree(self, parent_serial: str) -> ProductSubtree | None:
+        return self.repository.get_subtree(parent_serial)
+
+    def get_work_order_history(self, work_order: str, before_product_id: int | None, limit: int) -> ProductSubtree:
+        return self.repository.get_work_order_history(work_order, before_product_id, limit)
+
     def query_product_config(self, work_order: str) -> List[str]:
-        return [item['Description'] for item in list(querySN(work_order)['SubAssemblies'].values())]    # type: ignore
+        return [item['Description'] for item in list(self.serial_lookup.lookup(work_order)['SubAssemblies'].values())]    # type: ignore
     
     def validate_serial_number(self, serial_number: str) -> bool:
-        if querySN(serial_number):
+        if self.serial_lookup.lookup(serial_number):
             return True
         else:
             return False
     
     def query_product_info(self, serial_number: str) -> ProductDisplayInfo | None:
-        product_info = querySN(serial_number)
+        product_info = self.serial_lookup.lookup(serial_number)
         if product_info:
-            return ProductDisplayInfo(description=str(product_info["Description"]),
-                                      part_number=str(product_info['ProductNumber']),
-                                      revision=str(product_info["Revision"]),
-                                      serial_number=str(int(product_info['SerialNumber'])))   
+            return self._to_display_info(product_info)
         else: 
-            return None
\ No newline at end of file
+            return None
+
+    def lookup_serial_numbers(self, serial_numbers: List[str], timeout: float = 10.0) -> Dict[str, SerialLookupResult]:
+        serial_numbers = list(dict.fromkeys(serial_numbers))
+        pending = {serial_number: self._lookup_pool.submit(self.serial_lookup.lookup, serial_number) for serial_number in serial_numbers}
+        results: Dict[str, SerialLookupResult] = {}
+        while pending:
+            now = time.monotonic()
+            deadlines = []
+            for serial_number, future in list(pending.items()):
+                if future.done():
+                    results[serial_number] = self._to_lookup_result(serial_number, future)
+                elif future.started is not None and now - future.started >= timeout:
+                    # A querySN call cannot be interrupted; it finishes in the background and is ignored
+                    self._lookup_pool.abandon(future)
+                    results[serial_number] = SerialLookupResult(serial_number, False, error=f"Lookup timed out after {timeout} s")
+                elif future.started is None and self._lookup_pool.exhausted:
+                    self._lookup_pool.abandon(future)
+                    results[serial_number] = SerialLookupResult(serial_number, False,
+                                                                error=f"Lookup not started: {self._lookup_pool.hung} earlier lookups are still hung")
+                else:
+                    # Each lookup gets `timeout` from when it starts running, not from when it was queued
+                    deadlines.append(future.started + timeout if future.started is not None else now + QUEUED_LOOKUP_POLL)
+                    continue
+                del pending[serial_number]
+            if pending:
+                wait(pending.values(), timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+        return {serial_number: results[serial_number] for serial_number in serial_numbers}
+
+    def _to_lookup_result(self, serial_number: str, future: Future) -> SerialLookupResult:
+        try:
+            product_info = future.result()
+            info = self._to_display_info(product_info) if product_info else None
+        except Exception as e:
+            return SerialLookupResult(serial_number, False, error=str(e))
+        if info is not None:
+            return SerialLookupResult(serial_number, True, info)
+        return SerialLookupResult(serial_number, False, error=f"Serial Number {serial_number} does not exist.")
+
+    @staticmethod
+    def _to_display_info(product_info: Dict[str, Any]) -> ProductDisplayInfo:
+        return ProductDisplayInfo(description=str(product_info["Description"]),
+                                  part_number=str(product_info['ProductNumber']),
+                                  revision=str(product_info["Revision"]),
+                                  serial_number=str(int(product_info['SerialNumber'])))
\ No newline at end of file
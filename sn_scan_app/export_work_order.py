@@ -0,0 +1,102 @@
+"""
+Export everything scanned under a ConfigMO work order for traceability reports.
+Rows are streamed from the database in batches, so memory stays bounded however large the work order is.
+Child rows carry their parent's serial number.
+
+    python export_work_order.py CMO12345 --format csv --output CMO12345.csv
+    python export_work_order.py CMO12345 --format parquet --output CMO12345.parquet
+
+Parquet and Arrow output need pyarrow.
+"""
+from typing import Any, Iterator, List, Tuple
+from data_access_layer import SqlProductRepository
+import argparse
+import csv
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+DATABASE_URL = "mssql+pyodbc://@localhost\\SQLEXPRESS/DCIERP?driver=ODBC+Driver+17+for+SQL+Server"
+
+COLUMNS = ["ProductID", "ParentProductID", "ParentSerialNumber", "PartNumber", "SerialNumber", "WorkOrder", "DateStamp", "Employee"]
+
+Batches = Iterator[List[Tuple[Any, ...]]]
+
+
+def write_csv(batches: Batches, output: str) -> int:
+    count = 0
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for rows in batches:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def _arrow_schema() -> Any:
+    return pa.schema([
+        ("ProductID", pa.int64()),
+        ("ParentProductID", pa.int64()),
+        ("ParentSerialNumber", pa.string()),
+        ("PartNumber", pa.string()),
+        ("SerialNumber", pa.string()),
+        ("WorkOrder", pa.string()),
+        ("DateStamp", pa.timestamp("us")),
+        ("Employee", pa.string()),
+    ])
+
+
+def _record_batches(batches: Batches, schema: Any) -> Iterator[Any]:
+    for rows in batches:
+        # Transpose the row batch into columns
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+def write_parquet(batches: Batches, output: str) -> int:
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    schema = _arrow_schema()
+    count = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        # One row group per database batch
+        for record_batch in _record_batches(batches, schema):
+            writer.write_batch(record_batch)
+            count += record_batch.num_rows
+    return count
+
+
+def write_arrow(batches: Batches, output: str) -> int:
+    if pa is None:
+        raise RuntimeError("Arrow export needs pyarrow: pip install pyarrow")
+    schema = _arrow_schema()
+    count = 0
+    with pa.OSFile(output, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for record_batch in _record_batches(batches, schema):
+            writer.write_batch(record_batch)
+            count += record_batch.num_rows
+    return count
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "arrow": write_arrow}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("work_order", help="ConfigMO to export")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--output", help="output file, default <work_order>.<format>")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows fetched from the database at a time")
+    args = parser.parse_args()
+
+    output = args.output or f"{args.work_order}.{args.format}"
+    repository = SqlProductRepository(args.database_url)
+    count = WRITERS[args.format](repository.iter_work_order(args.work_order, args.batch_size), output)
+    print(f"Exported {count} rows for {args.work_order} to {output}")
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+from domain_layer import ISerialLookup
+import threading
+import time
+
+
+class CachedSerialLookup(ISerialLookup):
+    """
+    LRU + TTL cache in front of another ISerialLookup.
+    Unknown serial numbers are cached too (negative caching), with their own, usually shorter, TTL
+    so a board that gets registered in the ERP mid-session is picked up again quickly.
+    """
+    def __init__(self,
+                 lookup: ISerialLookup,
+                 max_size: int = 4096,
+                 ttl: float = 600.0,
+                 negative_ttl: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be greater than 0")
+        self._lookup = lookup
+        self._max_size = max_size
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any] | None]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, serial_number: str) -> Dict[str, Any] | None:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(serial_number)
+            if entry is not None:
+                expires_at, record = entry
+                if now < expires_at:
+                    self._entries.move_to_end(serial_number)
+                    self.hits += 1
+                    return record
+                del self._entries[serial_number]
+            self.misses += 1
+
+        # Do not hold the lock during the ERP round trip
+        record = self._lookup.lookup(serial_number)
+        expires_at = self._clock() + (self._ttl if record is not None else self._negative_ttl)
+
+        with self._lock:
+            self._entries[serial_number] = (expires_at, record)
+            self._entries.move_to_end(serial_number)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, serial_number: str) -> None:
+        with self._lock:
+            self._entries.pop(serial_number, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"CachedSerialLookup(size={len(self)}, hits={self.hits}, misses={self.misses})"
@@ -0,0 +1,15 @@
+-- Supports "latest entry for a serial number" lookups:
+--   WHERE SerialNumber = ? ORDER BY DateStamp DESC            (SqlProductRepository.query_product)
+--   ROW_NUMBER() OVER (PARTITION BY SerialNumber ORDER BY DateStamp DESC)   (SqlProductRepository.query_products)
+-- Safe to run more than once.
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_mfgProductHierarchy_SerialNumber_DateStamp'
+      AND object_id = OBJECT_ID('dbo.mfgProductHierarchy')
+)
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_mfgProductHierarchy_SerialNumber_DateStamp
+        ON dbo.mfgProductHierarchy (SerialNumber ASC, DateStamp DESC)
+        INCLUDE (PartNumber, WorkOrder, Employee, ParentProductID);
+END
+GO
@@ -0,0 +1,21 @@
+-- Stores the scan journal's idempotency key with each primary assembly written from the journal, so
+-- JournalFlusher can tell whether a retried entry already reached the database (SqlProductRepository.written_keys).
+-- Must be applied before the journal flusher writes to this database. Safe to run more than once.
+IF COL_LENGTH('dbo.mfgProductHierarchy', 'IdempotencyKey') IS NULL
+BEGIN
+    ALTER TABLE dbo.mfgProductHierarchy ADD IdempotencyKey VARCHAR(32) NULL;
+END
+GO
+
+-- Filtered, so rows without a key (children and direct writes) do not collide on NULL
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'UX_mfgProductHierarchy_IdempotencyKey'
+      AND object_id = OBJECT_ID('dbo.mfgProductHierarchy')
+)
+BEGIN
+    CREATE UNIQUE NONCLUSTERED INDEX UX_mfgProductHierarchy_IdempotencyKey
+        ON dbo.mfgProductHierarchy (IdempotencyKey)
+        WHERE IdempotencyKey IS NOT NULL;
+END
+GO
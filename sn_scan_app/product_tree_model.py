@@ -0,0 +1,397 @@
+from PyQt5.QtCore import QAbstractItemModel, QEventLoop, QModelIndex, QObject, QThreadPool, Qt, pyqtSignal
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Set
+from domain_layer import ProductDisplayInfo, ProductSubtree
+from search_index import SerialSearchIndex
+from workers import Worker
+
+# (work_order, before_product_id, limit) -> one page of history, newest first
+HistoryLoader = Callable[[str, int | None, int], ProductSubtree]
+
+
+class ProductTreeModel(QAbstractItemModel):
+    """
+    Product hierarchy for one work order, stored as flat column arrays instead of one item object per board.
+
+    Every board is a node number. Top level rows are the assemblies scanned in this session (newest first),
+    followed by the work order's history, which is fetched from the repository page by page as the view scrolls.
+    The database does not store revision or description, so history rows leave those columns empty.
+
+    set_filter_text() filters by serial number inside the model: a row is shown if it or one of its descendants
+    matches. Filtering swaps in lists of the shown rows and emits one layout change, so the view never hides rows
+    one by one. Filtered child lists are only built for the parents the view asks about.
+    """
+    COLUMNS = ["Serial Number", "Part Number", "Revision", "Description"]
+
+    # Emitted after nodes first..last (inclusive) have been added
+    nodes_added = pyqtSignal(int, int)
+    history_error = pyqtSignal(object)
+    # Emitted once per work order, when its first history page has arrived or failed to load
+    first_page_loaded = pyqtSignal()
+
+    def __init__(self, history_loader: HistoryLoader, thread_pool: QThreadPool, page_size: int = 500, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._history_loader = history_loader
+        self._thread_pool = thread_pool
+        self._page_size = page_size
+        self._filter_text = ""
+        self._reset_storage()
+        self._work_order: str | None = None
+        self._generation = 0
+
+    def _reset_storage(self) -> None:
+        self._columns: List[List[str]] = [[] for _ in self.COLUMNS]
+        self._parent = array("q")
+        # Position in the parent's child list, or in _live / _history for top level nodes
+        self._position = array("q")
+        self._is_live = bytearray()
+        self._children: Dict[int, array] = {}
+        self._live = array("q")
+        self._history = array("q")
+        # Part numbers, revisions and descriptions repeat a lot; store each distinct string once
+        self._strings: Dict[str, str] = {}
+        self._oldest_product_id: int | None = None
+        self._history_exhausted = False
+        self._loading = False
+        self._first_page_loaded = False
+        self._search_index: SerialSearchIndex[int] = SerialSearchIndex()
+        self._reset_filter()
+
+    def _reset_filter(self) -> None:
+        # None while no filter is set. Otherwise every node that matches or has a matching descendant
+        self._shown: Set[int] | None = None
+        # Nodes with at least one shown child, i.e. the ancestors of the matches
+        self._has_shown_children: Set[int] = set()
+        # The shown top level nodes, laid out like _live / _history, and each one's position in them
+        self._shown_live = array("q")
+        self._shown_history = array("q")
+        self._shown_position: Dict[int, int] = {}
+        # Shown children per parent, built when the view first asks for them
+        self._shown_children: Dict[int, array] = {}
+        # The top level lists rows are read from: _live / _history, or their shown parts while filtering
+        self._top_live = self._live
+        self._top_history = self._history
+
+    def set_work_order(self, work_order: str) -> None:
+        """
+        Clear the model and start browsing another work order. The first history page is requested right away,
+        on the thread pool. Nothing may be committed to the work order until it has arrived (wait_for_first_page()):
+        the page would then list the new assembly as history as well. Later pages are older, so they never overlap.
+        """
+        self.beginResetModel()
+        self._reset_storage()
+        self._work_order = work_order
+        self._generation += 1
+        if self._filter_text:
+            self._apply_filter()
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    @property
+    def work_order(self) -> str | None:
+        return self._work_order
+
+    def wait_for_first_page(self) -> None:
+        """
+        Keep the event loop running until the current work order's first history page has been loaded or has failed.
+        """
+        if self._work_order is None or self._first_page_loaded:
+            return
+        loop = QEventLoop()
+        self.first_page_loaded.connect(loop.quit)
+        loop.exec_()
+        self.first_page_loaded.disconnect(loop.quit)
+
+    def _page_done(self) -> None:
+        if not self._first_page_loaded:
+            self._first_page_loaded = True
+            self.first_page_loaded.emit()
+
+    # ---- node helpers ----
+
+    def _intern(self, text: str) -> str:
+        return self._strings.setdefault(text, text)
+
+    def _new_node(self, parent_node: int, is_live: bool, serial_number: str, part_number: str, revision: str, description: str) -> int:
+        node = len(self._parent)
+        self._columns[0].append(serial_number)
+        self._columns[1].append(self._intern(part_number))
+        self._columns[2].append(self._intern(revision))
+        self._columns[3].append(self._intern(description))
+        self._parent.append(parent_node)
+        self._is_live.append(is_live)
+        self._search_index.add(node, serial_number)
+        if parent_node == -1:
+            top = self._live if is_live else self._history
+            self._position.append(len(top))
+            top.append(node)
+        else:
+            children = self._children.setdefault(parent_node, array("q"))
+            self._position.append(len(children))
+            children.append(node)
+        return node
+
+    def _row_of(self, node: int) -> int:
+        parent_node = self._parent[node]
+        if parent_node != -1:
+            if self._shown is None:
+                return self._position[node]
+            # Child node numbers grow in insertion order, so a shown child list is sorted
+            return bisect_left(self._child_nodes(parent_node), node)
+        position = self._position[node] if self._shown is None else self._shown_position[node]
+        if self._is_live[node]:
+            return len(self._top_live) - 1 - position
+        return len(self._top_live) + position
+
+    def _top_node(self, row: int) -> int:
+        live = self._top_live
+        if row < len(live):
+            return live[len(live) - 1 - row]
+        return self._top_history[row - len(live)]
+
+    def _top_count(self) -> int:
+        return len(self._top_live) + len(self._top_history)
+
+    def _child_nodes(self, parent_node: int) -> array:
+        children = self._children.get(parent_node)
+        if children is None or self._shown is None:
+            return children if children is not None else array("q")
+        shown_children = self._shown_children.get(parent_node)
+        if shown_children is None:
+            shown = self._shown
+            shown_children = self._shown_children[parent_node] = array("q", [child for child in children if child in shown])
+        return shown_children
+
+    def is_shown(self, node: int) -> bool:
+        return self._shown is None or node in self._shown
+
+    def node_count(self) -> int:
+        return len(self._parent)
+
+    def text(self, node: int, column: int = 0) -> str:
+        return self._columns[column][node]
+
+    def parent_node(self, node: int) -> int:
+        return self._parent[node]
+
+    def index_of(self, node: int, column: int = 0) -> QModelIndex:
+        """
+        Index of a node, or an invalid index if the filter hides it.
+        """
+        if not self.is_shown(node):
+            return QModelIndex()
+        return self.createIndex(self._row_of(node), column, node)
+
+    # ---- QAbstractItemModel ----
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        # Called for every row the view lays out, so bounds are checked here rather than through hasIndex()
+        if row < 0 or not 0 <= column < len(self.COLUMNS) or parent.column() > 0:
+            return QModelIndex()
+        if parent.isValid():
+            children = self._child_nodes(parent.internalId())
+            if row >= len(children):
+                return QModelIndex()
+            node = children[row]
+        else:
+            live = self._top_live
+            if row < len(live):
+                node = live[len(live) - 1 - row]
+            elif row < len(live) + len(self._top_history):
+                node = self._top_history[row - len(live)]
+            else:
+                return QModelIndex()
+        return self.createIndex(row, column, node)
+
+    def parent(self, index: QModelIndex) -> QModelIndex:  # type: ignore[override]
+        if not index.isValid():
+            return QModelIndex()
+        parent_node = self._parent[index.internalId()]
+        if parent_node == -1:
+            return QModelIndex()
+        return self.createIndex(self._row_of(parent_node), 0, parent_node)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        if not parent.isValid():
+            return self._top_count()
+        return len(self._child_nodes(parent.internalId()))
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if parent.column() > 0:
+            return False
+        if not parent.isValid():
+            return self._top_count() > 0
+        node = parent.internalId()
+        if self._shown is not None:
+            return node in self._has_shown_children
+        return node in self._children
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(self.COLUMNS)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if index.isValid() and role == Qt.DisplayRole:
+            return self._columns[index.column()][index.internalId()]
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        return (not parent.isValid() and self._work_order is not None
+                and not self._history_exhausted and not self._loading)
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        """
+        Load the next history page on the thread pool. Rows are inserted when it arrives.
+        """
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        generation = self._generation
+        worker = Worker(self._history_loader, self._work_order, self._oldest_product_id, self._page_size)
+        worker.signals.result.connect(lambda page: self._append_history(generation, page))
+        worker.signals.error.connect(lambda error: self._history_failed(generation, error))
+        self._thread_pool.start(worker)
+
+    # ---- filtering ----
+
+    @property
+    def filter_text(self) -> str:
+        return self._filter_text
+
+    def set_filter_text(self, text: str) -> None:
+        """
+        Show only rows whose serial number contains `text`, plus their ancestors. An empty text shows everything.
+        """
+        if text == self._filter_text:
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        nodes = [(index.internalId(), index.column()) for index in persistent]
+        self._filter_text = text
+        if text:
+            self._apply_filter()
+        else:
+            self._reset_filter()
+        # Rows the view keeps track of (expanded, current, selected) move to their new place or disappear
+        self.changePersistentIndexList(persistent, [self.index_of(node, column) for node, column in nodes])
+        self.layoutChanged.emit()
+
+    def _apply_filter(self) -> None:
+        # search() returns a fresh set, so it can become the shown set without a copy
+        shown = self._shown = self._search_index.search(self._filter_text)
+        self._has_shown_children = set()
+        self._mark_shown(shown)
+        self._shown_live = array("q", [node for node in self._live if node in shown])
+        self._shown_history = array("q", [node for node in self._history if node in shown])
+        self._shown_position = {node: position for position, node in enumerate(self._shown_live)}
+        self._shown_position.update((node, position) for position, node in enumerate(self._shown_history))
+        self._shown_children = {}
+        self._top_live = self._shown_live
+        self._top_history = self._shown_history
+
+    def _mark_shown(self, matches: Set[int]) -> None:
+        """
+        Add the matches and all their ancestors to the shown nodes. Works one tree level at a time with set
+        operations, so a query matching most of the tree does not walk it node by node.
+        """
+        assert self._shown is not None
+        if matches is not self._shown:
+            self._shown |= matches
+        frontier = matches
+        while frontier:
+            parents = set(map(self._parent.__getitem__, frontier))
+            parents.discard(-1)
+            # Ancestors of a node that already had a shown child have been added before
+            frontier = parents - self._has_shown_children
+            self._has_shown_children |= parents
+            self._shown |= parents
+
+    def _show_new_nodes(self, nodes: Iterable[int]) -> None:
+        """
+        Work out which of freshly added nodes the current filter shows. Their subtrees are new,
+        so no shown child list built so far changes.
+        """
+        text = self._filter_text.lower()
+        serial_numbers = self._columns[0]
+        self._mark_shown({node for node in nodes if text in serial_numbers[node].lower()})
+
+    def _show_top_node(self, node: int) -> None:
+        top = self._shown_live if self._is_live[node] else self._shown_history
+        self._shown_position[node] = len(top)
+        top.append(node)
+
+    # ---- inserting rows ----
+
+    def add_assembly(self, product_info: ProductDisplayInfo, children_info: List[ProductDisplayInfo]) -> QModelIndex:
+        """
+        Add a freshly scanned assembly as the first row. Return its index, invalid if the filter hides it.
+        """
+        if self._shown is None:
+            self.beginInsertRows(QModelIndex(), 0, 0)
+        first = parent_node = self._new_node(-1, True, product_info.serial_number, product_info.part_number,
+                                             product_info.revision, product_info.description)
+        for child_info in children_info:
+            self._new_node(parent_node, True, child_info.serial_number, child_info.part_number,
+                           child_info.revision, child_info.description)
+        if self._shown is None:
+            self.endInsertRows()
+        else:
+            # The filtered row lists do not see the new nodes until they are inserted here
+            self._show_new_nodes(range(first, self.node_count()))
+            if parent_node in self._shown:
+                self.beginInsertRows(QModelIndex(), 0, 0)
+                self._show_top_node(parent_node)
+                self.endInsertRows()
+        self.nodes_added.emit(first, self.node_count() - 1)
+        return self.index_of(parent_node)
+
+    def _append_history(self, generation: int, page: ProductSubtree) -> None:
+        if generation != self._generation:
+            # The work order changed while the page was loading
+            return
+        self._loading = False
+        roots = [i for i, parent_index in enumerate(page.parent_index) if parent_index == -1]
+        if len(roots) < self._page_size:
+            self._history_exhausted = True
+        if not roots:
+            self._page_done()
+            return
+        self._oldest_product_id = min(page.product_id[i] for i in roots)
+
+        first_row = self.rowCount()
+        if self._shown is None:
+            self.beginInsertRows(QModelIndex(), first_row, first_row + len(roots) - 1)
+        first = self.node_count()
+        node_of: List[int] = []
+        for i in range(len(page)):
+            parent_index = page.parent_index[i]
+            parent_node = -1 if parent_index == -1 else node_of[parent_index]
+            node_of.append(self._new_node(parent_node, False, page.serial_number[i], page.part_number[i], "", ""))
+        if self._shown is None:
+            self.endInsertRows()
+        else:
+            self._show_new_nodes(node_of)
+            shown_roots = [node_of[i] for i in roots if node_of[i] in self._shown]
+            if shown_roots:
+                self.beginInsertRows(QModelIndex(), first_row, first_row + len(shown_roots) - 1)
+                for node in shown_roots:
+                    self._show_top_node(node)
+                self.endInsertRows()
+        self.nodes_added.emit(first, self.node_count() - 1)
+        self._page_done()
+
+    def _history_failed(self, generation: int, error: Exception) -> None:
+        if generation != self._generation:
+            return
+        self._loading = False
+        # Stop asking; the next set_work_order() tries again
+        self._history_exhausted = True
+        self.history_error.emit(error)
+        self._page_done()
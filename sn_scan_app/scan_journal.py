@@ -0,0 +1,277 @@
+"""
+Write-behind scan journal: assemblies are recorded in a local SQLite file and pushed to the product repository
+by a background thread.
+
+An assembly the database rejects (e.g. a serial number longer than its column) is parked: it stays in the journal
+with its LastError but no longer holds up the assemblies behind it. Parked entries are retried once requeued.
+
+    python scan_journal.py parked scan_journal.db
+    python scan_journal.py requeue scan_journal.db
+"""
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Any, Dict, List, Set
+from domain_layer import IProductRepository, IScanJournal, Product, RejectedWriteError
+import argparse
+import json
+import sqlite3
+import threading
+import uuid
+
+
+@dataclass
+class JournalEntry:
+    sequence: int
+    idempotency_key: str
+    parent: Product
+    children: List[Product]
+    attempts: int
+    last_error: str | None = None
+
+
+def _product_to_dict(product: Product) -> Dict[str, Any]:
+    return {
+        "part_number": product.part_number,
+        "serial_number": product.serial_number,
+        "work_order": product.work_order,
+        "date_stamp": product.date_stamp.isoformat(),
+        "employee": product.employee,
+    }
+
+
+def _product_from_dict(data: Dict[str, Any]) -> Product:
+    return Product(data["part_number"], data["serial_number"], data["work_order"], datetime.fromisoformat(data["date_stamp"]), data["employee"])
+
+
+class ScanJournal(IScanJournal):
+    """
+    Local, durable write-behind journal for scanned assemblies, stored in a SQLite file next to the app.
+    An entry is removed only after its assembly has been committed to the product repository.
+    Parked entries are kept, and left out of pending(), until requeue_parked().
+    """
+    def __init__(self, path: str) -> None:
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS ScanJournal ("
+            " Sequence INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " IdempotencyKey TEXT NOT NULL UNIQUE,"
+            " Payload TEXT NOT NULL,"
+            " Attempts INTEGER NOT NULL DEFAULT 0,"
+            " LastError TEXT,"
+            " Parked INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Journals written before entries could be parked
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(ScanJournal)")}
+        if "Parked" not in columns:
+            self._connection.execute("ALTER TABLE ScanJournal ADD COLUMN Parked INTEGER NOT NULL DEFAULT 0")
+        self._lock = threading.Lock()
+        self.appended = threading.Event()
+
+    def append(self, parent: Product, children: List[Product]) -> str:
+        idempotency_key = uuid.uuid4().hex
+        payload = json.dumps({"parent": _product_to_dict(parent), "children": [_product_to_dict(child) for child in children]})
+        with self._lock:
+            self._connection.execute("INSERT INTO ScanJournal (IdempotencyKey, Payload) VALUES (?, ?)", (idempotency_key, payload))
+        self.appended.set()
+        return idempotency_key
+
+    def pending(self, limit: int) -> List[JournalEntry]:
+        """
+        Return up to `limit` unflushed entries that are not parked, oldest first.
+        """
+        return self._entries("WHERE Parked = 0 ORDER BY Sequence LIMIT ?", (limit,))
+
+    def parked(self) -> List[JournalEntry]:
+        return self._entries("WHERE Parked = 1 ORDER BY Sequence", ())
+
+    def _entries(self, where: str, parameters: tuple) -> List[JournalEntry]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT Sequence, IdempotencyKey, Payload, Attempts, LastError FROM ScanJournal " + where, parameters
+            ).fetchall()
+        entries: List[JournalEntry] = []
+        for sequence, idempotency_key, payload, attempts, last_error in rows:
+            data = json.loads(payload)
+            entries.append(JournalEntry(sequence, idempotency_key, _product_from_dict(data["parent"]),
+                                        [_product_from_dict(child) for child in data["children"]], attempts, last_error))
+        return entries
+
+    def mark_flushed(self, idempotency_keys: List[str]) -> None:
+        with self._lock:
+            self._connection.executemany("DELETE FROM ScanJournal WHERE IdempotencyKey = ?", [(key,) for key in idempotency_keys])
+
+    def mark_attempted(self, idempotency_keys: List[str]) -> None:
+        """
+        Record that a write is about to be attempted. Done before the write, so an entry with attempts > 0
+        may already be in the repository even if the app died before mark_flushed.
+        """
+        with self._lock:
+            self._connection.executemany("UPDATE ScanJournal SET Attempts = Attempts + 1 WHERE IdempotencyKey = ?", [(key,) for key in idempotency_keys])
+
+    def record_error(self, idempotency_keys: List[str], error: str) -> None:
+        with self._lock:
+            self._connection.executemany("UPDATE ScanJournal SET LastError = ? WHERE IdempotencyKey = ?", [(error, key) for key in idempotency_keys])
+
+    def park(self, idempotency_key: str, error: str) -> None:
+        with self._lock:
+            self._connection.execute("UPDATE ScanJournal SET Parked = 1, LastError = ? WHERE IdempotencyKey = ?", (error, idempotency_key))
+
+    def requeue_parked(self) -> int:
+        """
+        Put parked entries back in the queue, e.g. after the data or the schema has been fixed. Return how many.
+        """
+        with self._lock:
+            cursor = self._connection.execute("UPDATE ScanJournal SET Parked = 0 WHERE Parked = 1")
+        if cursor.rowcount:
+            self.appended.set()
+        return cursor.rowcount
+
+    def backlog(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM ScanJournal").fetchone()[0]
+
+    def parked_count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM ScanJournal WHERE Parked = 1").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class JournalFlusher(threading.Thread):
+    """
+    Background thread that pushes journaled assemblies to the product repository in batched transactions.
+    If the repository rejects a batch, its entries are retried one by one and the ones rejected on their own are parked.
+    On any other failure the batch stays in the journal and is retried with exponential backoff.
+    """
+    def __init__(self,
+                 journal: ScanJournal,
+                 repository: IProductRepository,
+                 batch_size: int = 50,
+                 poll_interval: float = 5.0,
+                 max_backoff: float = 60.0) -> None:
+        super().__init__(name="JournalFlusher", daemon=True)
+        self._journal = journal
+        self._repository = repository
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_backoff = max_backoff
+        self._stopping = threading.Event()
+        self.last_error: str | None = None
+
+    def run(self) -> None:
+        failures = 0
+        while not self._stopping.is_set():
+            # Cleared before reading the journal, so a scan appended during the flush is not missed
+            self._journal.appended.clear()
+            try:
+                flushed = self.flush_once()
+                failures = 0
+                self.last_error = None
+            except Exception as e:
+                failures += 1
+                self.last_error = str(e)
+                self._stopping.wait(min(self._max_backoff, 2 ** (failures - 1)))
+                continue
+
+            if flushed < self._batch_size:
+                # Caught up: sleep until the next scan or the next poll
+                self._journal.appended.wait(self._poll_interval)
+
+    def flush_once(self) -> int:
+        """
+        Push one batch from the journal to the repository. Return the number of entries flushed.
+        """
+        entries = self._journal.pending(self._batch_size)
+        if not entries:
+            return 0
+
+        already_written = self._already_written(entries)
+        to_write = [entry for entry in entries if entry.idempotency_key not in already_written]
+        if to_write:
+            keys = [entry.idempotency_key for entry in to_write]
+            self._journal.mark_attempted(keys)
+            try:
+                self._repository.add_assemblies([(entry.parent, entry.children) for entry in to_write], keys)
+            except RejectedWriteError as e:
+                # Some entry in the batch is bad; find it instead of retrying the whole batch forever
+                self._journal.record_error(keys, str(e))
+                return self._flush_individually(entries, to_write)
+            except Exception as e:
+                self._journal.record_error(keys, str(e))
+                raise
+        self._journal.mark_flushed([entry.idempotency_key for entry in entries])
+        return len(entries)
+
+    def _flush_individually(self, entries: List[JournalEntry], to_write: List[JournalEntry]) -> int:
+        """
+        Write each entry in its own transaction and park the ones the repository rejects.
+        Return the number of entries that left the queue, parked ones included.
+        """
+        write_keys = {entry.idempotency_key for entry in to_write}
+        done = [entry.idempotency_key for entry in entries if entry.idempotency_key not in write_keys]
+        parked = 0
+        try:
+            for entry in to_write:
+                self._journal.mark_attempted([entry.idempotency_key])
+                try:
+                    self._repository.add_assemblies([(entry.parent, entry.children)], [entry.idempotency_key])
+                except RejectedWriteError as e:
+                    if self._repository.written_keys([entry.idempotency_key]):
+                        # A duplicate key: an earlier attempt went through after all
+                        done.append(entry.idempotency_key)
+                        continue
+                    self._journal.park(entry.idempotency_key, str(e))
+                    parked += 1
+                except Exception as e:
+                    # Lost the repository part way through: keep what got in, back off for the rest
+                    self._journal.record_error([entry.idempotency_key], str(e))
+                    raise
+                else:
+                    done.append(entry.idempotency_key)
+        finally:
+            self._journal.mark_flushed(done)
+        return len(done) + parked
+
+    def _already_written(self, entries: List[JournalEntry]) -> Set[str]:
+        """
+        An entry whose commit succeeded but whose journal row was not removed (e.g. the app was killed in between)
+        must not be written twice. Its idempotency key is stored with the parent row, so look the keys up.
+        """
+        retried = [entry.idempotency_key for entry in entries if entry.attempts > 0]
+        if not retried:
+            return set()
+        return self._repository.written_keys(retried)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        self._journal.appended.set()
+        self.join(timeout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parked_parser = subparsers.add_parser("parked", help="list the entries the database rejected")
+    parked_parser.add_argument("path")
+    requeue_parser = subparsers.add_parser("requeue", help="retry the parked entries")
+    requeue_parser.add_argument("path")
+    args = parser.parse_args()
+
+    journal = ScanJournal(args.path)
+    try:
+        if args.command == "parked":
+            entries = journal.parked()
+            for entry in entries:
+                children = ", ".join(child.serial_number for child in entry.children)
+                print(f"#{entry.sequence}  {entry.parent.date_stamp:%Y-%m-%d %H:%M:%S}  {entry.parent.work_order}  "
+                      f"{entry.parent.serial_number} [{children}]  attempts: {entry.attempts}")
+                print(f"    {entry.last_error}")
+            print(f"{len(entries)} parked, {journal.backlog()} unwritten in total")
+        else:
+            print(f"Requeued {journal.requeue_parked()} entries")
+    finally:
+        journal.close()
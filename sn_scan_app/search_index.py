@@ -0,0 +1,59 @@
+from collections import defaultdict
+from typing import Dict, Generic, Hashable, Set, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class SerialSearchIndex(Generic[K]):
+    """
+    Case-insensitive substring search over serial numbers, kept up to date as rows are added.
+    Queries of at least `n` characters intersect n-gram posting sets instead of scanning every row.
+    A query that extends the previous one (the usual case while typing) only re-checks the previous result.
+    """
+    def __init__(self, n: int = 3) -> None:
+        if n <= 0:
+            raise ValueError("n must be greater than 0")
+        self._n = n
+        self._serials: Dict[K, str] = {}
+        self._postings: Dict[str, Set[K]] = defaultdict(set)
+        self._last_query = ""
+        self._last_result: Set[K] = set()
+
+    def _ngrams(self, text: str) -> Set[str]:
+        return {text[i:i + self._n] for i in range(len(text) - self._n + 1)}
+
+    def add(self, key: K, serial_number: str) -> None:
+        serial_number = serial_number.lower()
+        self._serials[key] = serial_number
+        for gram in self._ngrams(serial_number):
+            self._postings[gram].add(key)
+        # Keep the cached result valid so the next refinement can still narrow it
+        if self._last_query and self._last_query in serial_number:
+            self._last_result.add(key)
+
+    def search(self, query: str) -> Set[K]:
+        """
+        Return the keys of all rows whose serial number contains the query.
+        An empty query matches every row.
+        """
+        query = query.lower()
+        if not query:
+            result = set(self._serials)
+        elif self._last_query and self._last_query in query:
+            result = {key for key in self._last_result if query in self._serials[key]}
+        elif len(query) >= self._n:
+            postings = sorted((self._postings.get(gram, set()) for gram in self._ngrams(query)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            result = {key for key in candidates if query in self._serials[key]}
+        else:
+            result = {key for key, serial_number in self._serials.items() if query in serial_number}
+
+        self._last_query = query
+        self._last_result = result
+        return set(result)
+
+    def __len__(self) -> int:
+        return len(self._serials)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._serials
@@ -0,0 +1,194 @@
+"""
+Bloom filter of known serial numbers, used to reject mistyped scans without an ERP round trip.
+
+The filter is built from an ERP export listing every serial number that has been issued (one per line), and
+memory-mapped at startup. It must not be built from mfgProductHierarchy: that only holds boards already scanned,
+so every new board would be rejected. A negative answer is definite; a positive answer may be a false positive and
+still goes to querySN. Serial numbers issued after the export are rejected until it is rebuilt, so rebuild it on
+a schedule.
+
+    python serial_prefilter.py build known_serials.bloom --source erp_serials.txt --fp-rate 0.001
+    python serial_prefilter.py report known_serials.bloom --source erp_serials.txt
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator
+from domain_layer import ISerialLookup
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import random
+import struct
+import threading
+
+_MAGIC = b"SNBLOOM1"
+# magic, number of bits, number of hash functions, number of serial numbers
+_HEADER = struct.Struct("<8sQIQ")
+
+
+def _normalize(serial_number: str) -> bytes:
+    return serial_number.strip().encode()
+
+
+class SerialBloomFilter:
+    def __init__(self, bits: Any, number_of_bits: int, number_of_hashes: int, count: int) -> None:
+        """
+        Use build() or open() instead of calling this directly.
+        :param bits: the bit array, a bytearray or a memory map positioned after the header
+        """
+        self._bits = bits
+        self._offset = _HEADER.size if isinstance(bits, mmap.mmap) else 0
+        self.number_of_bits = number_of_bits
+        self.number_of_hashes = number_of_hashes
+        self.count = count
+
+    @staticmethod
+    def optimal_parameters(count: int, false_positive_rate: float) -> tuple[int, int]:
+        count = max(count, 1)
+        number_of_bits = max(8, math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2))
+        number_of_hashes = max(1, round(number_of_bits / count * math.log(2)))
+        return number_of_bits, number_of_hashes
+
+    def _positions(self, key: bytes) -> Iterator[int]:
+        # Kirsch-Mitzenmacher: k positions from two 64-bit hashes
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        h2 |= 1
+        for i in range(self.number_of_hashes):
+            yield (h1 + i * h2) % self.number_of_bits
+
+    def _add(self, serial_number: str) -> None:
+        for position in self._positions(_normalize(serial_number)):
+            self._bits[self._offset + (position >> 3)] |= 1 << (position & 7)
+
+    def might_contain(self, serial_number: str) -> bool:
+        bits, offset = self._bits, self._offset
+        for position in self._positions(_normalize(serial_number)):
+            if not bits[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def fill_ratio(self) -> float:
+        """
+        Fraction of bits set.
+        """
+        data = self._bits[self._offset:self._offset + (self.number_of_bits + 7) // 8]
+        return sum(bin(byte).count("1") for byte in data) / self.number_of_bits
+
+    def estimated_false_positive_rate(self) -> float:
+        return self.fill_ratio() ** self.number_of_hashes
+
+    @classmethod
+    def build(cls, serial_numbers: Iterable[str], path: str, false_positive_rate: float = 0.001) -> "SerialBloomFilter":
+        """
+        Write a new filter file. The snapshot is written to a temporary file first and then swapped in,
+        so a running app that has the old file mapped is not affected.
+        """
+        unique = {serial_number.strip() for serial_number in serial_numbers if serial_number.strip()}
+        number_of_bits, number_of_hashes = cls.optimal_parameters(len(unique), false_positive_rate)
+        bloom = cls(bytearray((number_of_bits + 7) // 8), number_of_bits, number_of_hashes, len(unique))
+        for serial_number in unique:
+            bloom._add(serial_number)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, number_of_bits, number_of_hashes, len(unique)))
+            f.write(bloom._bits)
+        os.replace(tmp_path, path)
+        return bloom
+
+    @classmethod
+    def open(cls, path: str) -> "SerialBloomFilter":
+        """
+        Memory-map an existing filter file read-only. Pages are loaded by the OS on demand.
+        """
+        with open(path, "rb") as f:
+            bits = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, number_of_bits, number_of_hashes, count = _HEADER.unpack_from(bits, 0)
+        if magic != _MAGIC:
+            bits.close()
+            raise ValueError(f"{path} is not a serial number Bloom filter")
+        if len(bits) < _HEADER.size + (number_of_bits + 7) // 8:
+            bits.close()
+            raise ValueError(f"{path} is truncated")
+        return cls(bits, number_of_bits, number_of_hashes, count)
+
+    def close(self) -> None:
+        if isinstance(self._bits, mmap.mmap):
+            self._bits.close()
+
+
+class PrefilteredSerialLookup(ISerialLookup):
+    """
+    Answers "unknown" straight from the Bloom filter for serial numbers it has definitely never seen,
+    and forwards everything else to the wrapped lookup.
+    Only keys accepted by `applies_to` are checked; ConfigMO work orders and anything else pass straight through.
+    """
+    def __init__(self, lookup: ISerialLookup, bloom: SerialBloomFilter, applies_to: Callable[[str], bool] = str.isdigit) -> None:
+        self._lookup = lookup
+        self._bloom = bloom
+        self._applies_to = applies_to
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def lookup(self, serial_number: str) -> Dict[str, Any] | None:
+        if self._applies_to(serial_number.strip()) and not self._bloom.might_contain(serial_number):
+            with self._lock:
+                self.rejected += 1
+            return None
+        return self._lookup.lookup(serial_number)
+
+
+def _read_source(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+def _measure_false_positive_rate(bloom: SerialBloomFilter, known: set[str], samples: int) -> float:
+    """
+    Probe random serial numbers shaped like the known ones but not in the set.
+    """
+    lengths = sorted({len(serial_number) for serial_number in known}) or [10]
+    false_positives = tested = 0
+    while tested < samples:
+        candidate = "".join(random.choice("0123456789") for _ in range(random.choice(lengths)))
+        if candidate in known:
+            continue
+        tested += 1
+        false_positives += bloom.might_contain(candidate)
+    return false_positives / tested
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="rebuild the snapshot")
+    build_parser.add_argument("path")
+    build_parser.add_argument("--source", required=True, help="ERP export with every issued serial number, one per line")
+    build_parser.add_argument("--fp-rate", type=float, default=0.001, help="target false-positive rate")
+
+    report_parser = subparsers.add_parser("report", help="describe a snapshot and measure its false-positive rate")
+    report_parser.add_argument("path")
+    report_parser.add_argument("--source", help="the serial numbers the snapshot was built from, to measure the real false-positive rate")
+    report_parser.add_argument("--samples", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        serial_numbers = _read_source(args.source)
+        bloom = SerialBloomFilter.build(serial_numbers, args.path, args.fp_rate)
+        print(f"Wrote {args.path}: {bloom.count} serial numbers, {bloom.number_of_bits} bits, {bloom.number_of_hashes} hashes")
+    else:
+        bloom = SerialBloomFilter.open(args.path)
+        print(f"{args.path}: {bloom.count} serial numbers, {bloom.number_of_bits} bits ({bloom.number_of_bits / 8 / 2 ** 20:.2f} MiB), "
+              f"{bloom.number_of_hashes} hashes")
+        print(f"fill ratio: {bloom.fill_ratio():.3f}   estimated false-positive rate: {bloom.estimated_false_positive_rate():.5f}")
+        if args.source:
+            known = set(_read_source(args.source))
+            missing = sum(not bloom.might_contain(serial_number) for serial_number in known)
+            print(f"measured false-positive rate: {_measure_false_positive_rate(bloom, known, args.samples):.5f} over {args.samples} samples")
+            if missing:
+                print(f"WARNING: {missing} serial numbers from the source are not in the snapshot; rebuild it")
+        bloom.close()
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+from data_access_layer import Base, SqlProductRepository
+from datetime import datetime, timezone
+from domain_layer import Product
+
+
+def board(serial_number: str) -> Product:
+    return Product("PN-1", serial_number, "WO1", datetime.now(timezone.utc), "tester")
+
+
+def test_in_memory_repository_is_shared_across_threads():
+    repository = SqlProductRepository("sqlite://")
+    # Created on this thread; the workers below must see the same database
+    Base.metadata.create_all(repository.engine)
+
+    def add(i: int) -> int:
+        return repository.add_assembly(board(f"{i}00"), [board(f"{i}01"), board(f"{i}02")])
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        parent_ids = list(executor.map(add, range(20)))
+        subtrees = list(executor.map(repository.get_subtree, [f"{i}00" for i in range(20)]))
+
+    assert len(set(parent_ids)) == 20
+    assert all(subtree is not None and len(subtree) == 3 for subtree in subtrees)
+    assert set(repository.query_products([f"{i}01" for i in range(20)])) == {f"{i}01" for i in range(20)}
+    repository.engine.dispose()
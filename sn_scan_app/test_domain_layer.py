@@ -0,0 +1,80 @@
+from domain_layer import ISerialLookup, ProductService
+from typing import Any, Dict
+import threading
+import time
+import pytest
+
+
+class FakeLookup(ISerialLookup):
+    """
+    Serial numbers starting with "slow" take 0.3 s; ones starting with "hang" block until released.
+    """
+    def __init__(self) -> None:
+        self.release = threading.Event()
+
+    def lookup(self, serial_number: str) -> Dict[str, Any] | None:
+        if serial_number.startswith("hang"):
+            self.release.wait(10)
+        elif serial_number.startswith("slow"):
+            time.sleep(0.3)
+        elif serial_number.startswith("bad"):
+            raise ConnectionError("ERP unreachable")
+        if not serial_number.startswith(("1", "slow")):
+            return None
+        return {"Description": "Board", "ProductNumber": "PN-1", "Revision": "A", "SerialNumber": "1"}
+
+
+@pytest.fixture
+def lookup():
+    lookup = FakeLookup()
+    yield lookup
+    lookup.release.set()
+
+
+def test_results_are_keyed_by_serial_number(lookup):
+    service = ProductService(None, lookup, max_lookup_workers=2)
+    results = service.lookup_serial_numbers(["10", "20", "bad", "10"], timeout=1)
+    assert list(results) == ["10", "20", "bad"]
+    assert results["10"].valid and results["10"].info is not None
+    assert results["20"].error == "Serial Number 20 does not exist."
+    assert results["bad"].error == "ERP unreachable"
+    service.close()
+
+
+def test_timeout_starts_when_the_lookup_starts(lookup):
+    # slow3 has to wait for a worker for longer than the timeout, but runs well within it once started
+    service = ProductService(None, lookup, max_lookup_workers=2)
+    results = service.lookup_serial_numbers(["hang1", "slow1", "slow2", "slow3"], timeout=0.4)
+    assert results["hang1"].error == "Lookup timed out after 0.4 s"
+    assert all(results[serial_number].valid for serial_number in ["slow1", "slow2", "slow3"])
+    service.close()
+
+
+def test_hung_lookup_times_out_without_holding_up_the_rest(lookup):
+    service = ProductService(None, lookup, max_lookup_workers=1)
+    start = time.monotonic()
+    results = service.lookup_serial_numbers(["hang1", "11", "12"], timeout=0.2)
+    assert time.monotonic() - start < 1
+    assert results["hang1"].error == "Lookup timed out after 0.2 s"
+    assert results["11"].valid and results["12"].valid
+    # The hung call got a replacement worker, so the next lookups still run
+    assert service.lookup_serial_numbers(["13"], timeout=0.2)["13"].valid
+    service.close()
+
+
+def test_exhausted_pool_is_reported_apart_from_timeouts(lookup):
+    service = ProductService(None, lookup, max_lookup_workers=1)
+    # One worker plus one replacement, and both end up stuck
+    service.lookup_serial_numbers(["hang1"], timeout=0.1)
+    service.lookup_serial_numbers(["hang2"], timeout=0.1)
+    start = time.monotonic()
+    result = service.lookup_serial_numbers(["11"], timeout=5)["11"]
+    assert time.monotonic() - start < 1
+    assert not result.valid and result.error == "Lookup not started: 2 earlier lookups are still hung"
+
+    lookup.release.set()
+    deadline = time.monotonic() + 5
+    while service.lookup_serial_numbers(["12"], timeout=1)["12"].error is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert service.lookup_serial_numbers(["13"], timeout=1)["13"].valid
+    service.close()
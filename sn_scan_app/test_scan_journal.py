@@ -0,0 +1,70 @@
+from data_access_layer import Base, ProductHierarchy, SqlProductRepository
+from datetime import datetime, timezone
+from domain_layer import Product
+from scan_journal import JournalFlusher, ScanJournal
+from sqlalchemy import func, select, text
+import pytest
+
+
+def board(serial_number: str) -> Product:
+    return Product("PN-1", serial_number, "WO1", datetime.now(timezone.utc), "tester")
+
+
+@pytest.fixture
+def repository():
+    repository = SqlProductRepository("sqlite://")
+    Base.metadata.create_all(repository.engine)
+    yield repository
+    repository.engine.dispose()
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = ScanJournal(str(tmp_path / "journal.db"))
+    yield journal
+    journal.close()
+
+
+def rows_for(repository: SqlProductRepository, serial_number: str) -> int:
+    with repository.session_scope() as session:
+        return session.scalar(select(func.count()).where(ProductHierarchy.SerialNumber == serial_number))
+
+
+def test_replay_of_an_already_written_key_does_not_write_twice(repository, journal):
+    parent, children = board("1000"), [board("1001"), board("1002")]
+    key = journal.append(parent, children)
+    # The app was killed after the commit but before the journal entry was removed
+    journal.mark_attempted([key])
+    repository.add_assemblies([(parent, children)], [key])
+
+    assert JournalFlusher(journal, repository).flush_once() == 1
+    assert journal.backlog() == 0
+    assert rows_for(repository, "1000") == 1
+    assert rows_for(repository, "1001") == 1
+
+
+def test_retried_entry_that_never_reached_the_database_is_written(repository, journal):
+    key = journal.append(board("2000"), [board("2001")])
+    # An earlier attempt failed before its commit
+    journal.mark_attempted([key])
+
+    assert JournalFlusher(journal, repository).flush_once() == 1
+    assert journal.backlog() == 0
+    assert repository.written_keys([key]) == {key}
+    assert rows_for(repository, "2000") == 1
+
+
+def test_check_schema_names_the_missing_migration():
+    repository = SqlProductRepository("sqlite://")
+    with repository.engine.begin() as connection:
+        # mfgProductHierarchy as it was before migrations/0002_idempotency_key.sql
+        connection.execute(text(
+            "CREATE TABLE mfgProductHierarchy (ProductID INTEGER PRIMARY KEY, PartNumber VARCHAR(20), SerialNumber VARCHAR(20),"
+            " WorkOrder VARCHAR(10), DateStamp DATETIME, Employee VARCHAR(20), ParentProductID INTEGER)"))
+    with pytest.raises(RuntimeError, match="0002_idempotency_key.sql"):
+        repository.check_schema()
+    repository.engine.dispose()
+
+
+def test_check_schema_accepts_a_migrated_database(repository):
+    repository.check_schema()
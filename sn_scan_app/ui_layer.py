@@ -1,10 +1,12 @@
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QPushButton, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QLabel, QWidget, QInputDialog, QDialog, QComboBox, QDialogButtonBox, QLineEdit
+    QMainWindow, QPushButton, QVBoxLayout, QTreeView, QLabel, QWidget, QInputDialog, QDialog, QComboBox, QDialogButtonBox, QLineEdit, QMessageBox
 )
-from PyQt5.QtGui import QFont
-from domain_layer import IProductService, Product
-from typing import List, Any
-from datetime import datetime
+from PyQt5.QtGui import QFont, QCloseEvent
+from PyQt5.QtCore import QThreadPool, QTimer
+from domain_layer import IProductService, ProductDisplayInfo, SerialLookupResult
+from workers import TaskGroup, Worker
+from product_tree_model import ProductTreeModel
+from typing import List, Tuple
 
 def get_text_with_custom_font(title: str, label: str, font: QFont, style: str):
     dialog = QInputDialog()
@@ -53,14 +55,26 @@ class ProductScannerUI(QMainWindow):
         self.search_bar = QLineEdit()
         self.search_bar.setPlaceholderText("Search Serial Number")
         self.search_bar.setFont(font)
-        self.search_bar.textChanged.connect(self.filter_tree)
+        self.search_bar.textChanged.connect(self.schedule_filter)
         self.layout.addWidget(self.search_bar)
 
-        # Tree Widget for Product Hierarchy
-        self.tree_widget = QTreeWidget()
-        self.tree_widget.setHeaderLabels(["Serial Number", "Part Number", "Revision", "Description"])
-        self.tree_widget.setFont(font)
-        self.layout.addWidget(self.tree_widget)
+        # ERP lookups may run in parallel. Database writes go through a single thread so they stay in scan order
+        self.lookup_pool = QThreadPool.globalInstance()
+        self.commit_pool = QThreadPool(self)
+        self.commit_pool.setMaxThreadCount(1)
+
+        # Tree View for Product Hierarchy. The model only materializes what the view asks for and pages history in lazily
+        self.tree_model = ProductTreeModel(self.product_service.get_work_order_history, self.lookup_pool, parent=self)
+        self.tree_model.nodes_added.connect(self.index_nodes)
+        self.tree_model.modelReset.connect(self.reset_column_widths)
+        self.tree_model.history_error.connect(lambda e: self.error_label.setText(f"Could not load history: {e}"))
+        self.tree_view = QTreeView()
+        self.tree_view.setModel(self.tree_model)
+        self.tree_view.setFont(font)
+        # All rows are one line of text; lets the view skip measuring every row
+        self.tree_view.setUniformRowHeights(True)
+        self.layout.addWidget(self.tree_view)
+        self.column_widths = [0] * self.tree_model.columnCount()
 
         # Error Display
         # TODO: Replace error_label with error_prompt 
@@ -74,18 +88,44 @@ class ProductScannerUI(QMainWindow):
         self.counter_label.setFont(font)
         self.layout.addWidget(self.counter_label)
 
-        self.parent_item = None  # Placeholder for the parent product item
+        # Scan journal backlog: assemblies saved locally but not yet written to the database
+        self.backlog_label = QLabel("Pending uploads: 0")
+        self.backlog_label.setFont(font)
+        self.layout.addWidget(self.backlog_label)
+
         self.primary_assembly_count = 0
+        # Set when a background commit fails; the scan loop stops at its next iteration
+        self.commit_error: str | None = None
+
+        # Only filter once the operator pauses typing
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.filter_tree)
+
+        self.backlog_timer = QTimer(self)
+        self.backlog_timer.setInterval(1000)
+        self.backlog_timer.timeout.connect(self.update_backlog)
+        self.backlog_timer.start()
 
 
     def start_workflow(self):
         """
         Triggered when 'Start Workflow' button is clicked.
-        Prompts the user to enter the parent serial number and child serial number.
+        The button stays disabled while the workflow runs: waiting for validations keeps the event loop running,
+        and a second click would otherwise start a nested workflow.
         """
-        # TODO: I don't think clearing the tree is necessary
-        # self.tree_widget.clear()
+        self.start_button.setEnabled(False)
+        try:
+            self.run_workflow()
+        finally:
+            self.start_button.setEnabled(True)
 
+    def run_workflow(self):
+        """
+        Prompts the user to enter the parent serial number and child serial number.
+        """
+        self.commit_error = None
         # Create a custom font
         font = QFont()
         font.setPointSize(12)  # Increase font size
@@ -106,6 +146,11 @@ class ProductScannerUI(QMainWindow):
         else:
             self.error_label.setText("ConfigMO cannot be empty.")
             return
+
+        # The tree shows one work order: what is scanned now plus its history from the database
+        if self.tree_model.work_order != self.work_order:
+            self.tree_model.set_work_order(self.work_order)
+
         # TODO: Find all subassemblies based on the ConfigMO 
         list_of_assemblies = self.product_service.query_product_config(self.work_order)
 
@@ -140,7 +185,14 @@ class ProductScannerUI(QMainWindow):
             self.error_label.setText("No primary assembly selected")
             return
 
+        # Until the work order's history has been read, a new assembly could show up in it as well as on top
+        self.tree_model.wait_for_first_page()
+
         while True:
+            # Do not let the operator keep scanning while assemblies are not being saved
+            if self.commit_error is not None:
+                self.error_label.setText(f"Assembly commit failed: {self.commit_error}")
+                return
             self.error_label.setText("")
 
             # Prompt for Parent Serial Number
@@ -149,80 +201,157 @@ class ProductScannerUI(QMainWindow):
                 self.error_label.setText("Primary assembly serial number can not be empty")
                 return
 
-            # Validate Parent Serial Number
+            # Validate serial numbers in the background while the operator keeps scanning
             # TODO: validation should confirm the serial number matches the expected part number
-            validation_result = self.product_service.validate_serial_number(parent_serial)
-            if not validation_result:
-                self.error_label.setText(f"Serial Number {parent_serial} does not exist.")
-                return
+            validations = TaskGroup(self.lookup_pool, self)
+            validations.submit(parent_serial, self.product_service.validate_serial_number, parent_serial)
+
+            try:
+                list_of_children: List[str] = []
+                for item in list_of_assemblies:
+                    # Stop as soon as a validation that already finished has failed
+                    invalid_serial = self.first_invalid_serial(validations)
+                    if invalid_serial is not None:
+                        self.error_label.setText(f"Serial Number {invalid_serial} does not exist.")
+                        return
 
-            list_of_children: List[str] = []
-            for item in list_of_assemblies:
+                    child_serial, ok = get_text_with_custom_font(f"{item}", f"Scan or enter the child serial number for {item} (or leave blank to finish):", font, "background-color: lightgreen;")
+                    if not ok or not child_serial.strip():
+                       self.error_label.setText("Secondary assembly serial number can not be empty.") 
+                       return
 
-                child_serial, ok = get_text_with_custom_font(f"{item}", f"Scan or enter the child serial number for {item} (or leave blank to finish):", font, "background-color: lightgreen;")
-                if not ok or not child_serial.strip():
-                   self.error_label.setText("Secondary assembly serial number can not be empty.") 
-                   return
+                    validations.submit(child_serial, self.product_service.validate_serial_number, child_serial)
+                    list_of_children.append(child_serial)
 
-                # Validate Child Serial Number
-                child_serial_number_validation_result = self.product_service.validate_serial_number(child_serial)
-                if not child_serial_number_validation_result:
-                    self.error_label.setText(f"Serial Number {child_serial} does not exist.")
+                # Only the lookups still in flight are waited on here, and the event loop keeps running meanwhile
+                validations.wait()
+                invalid_serial = self.first_invalid_serial(validations)
+                if invalid_serial is not None:
+                    self.error_label.setText(f"Serial Number {invalid_serial} does not exist.")
                     return
-                
-                list_of_children.append(child_serial)
+                # A commit may have failed while this assembly was being scanned
+                if self.commit_error is not None:
+                    continue
 
-            try:
                 # Push the product info to the database first. Then retrieve them for display. There should only be one source of truth
-                parent_product_id = self.product_service.add_product(parent_serial, None, self.work_order)
-                for child_serial in list_of_children:
-                    self.product_service.add_product(child_serial, parent_product_id, self.work_order)
-            except ValueError as e:
-                self.error_label.setText(str(e))
-                return
-            
-            # Add Parent to Tree
-            # TODO: Query the information from the database directly
-            product_info = self.product_service.query_product_info(parent_serial)
-            if not product_info:
-                self.error_label.setText(f"Product information is not available for {parent_serial}")
-                return
-            self.parent_item = QTreeWidgetItem([product_info.serial_number, product_info.part_number, product_info.revision, product_info.description])
-            self.tree_widget.addTopLevelItem(self.parent_item)
-            # Add Child to Parent
-            for child_serial in list_of_children:
-                if self.parent_item:
-                    child_product_info = self.product_service.query_product_info(child_serial)
-                    if not child_product_info:
-                        self.error_label.setText(f"Product information is not available for {child_serial}")
-                        return
-                    child_item = QTreeWidgetItem([child_product_info.serial_number, child_product_info.part_number, child_product_info.revision, child_product_info.description])
-                    self.parent_item.addChild(child_item)
-            
-            self.tree_widget.expandAll() 
-                 
-            for i in range(self.tree_widget.columnCount()):
-                self.tree_widget.resizeColumnToContents(i)
-                
-            self.primary_assembly_count += 1
-            self.counter_label.setText(f"Primary Assemblies Scanned: {self.primary_assembly_count}")
+                # The commit runs on its own single-threaded pool, so assemblies are written in scan order
+                worker = Worker(self.commit_assembly, parent_serial, list_of_children, self.work_order)
+                worker.signals.result.connect(self.show_assembly)
+                worker.signals.error.connect(self.show_commit_error)
+                self.commit_pool.start(worker)
+            finally:
+                validations.delete_when_done()
 
-    def filter_tree(self, text: str):
+    def first_invalid_serial(self, validations: TaskGroup) -> str | None:
         """
-        Filter the tree items based on the search text.
+        Return the first serial number whose finished validation failed, or None.
         """
-        for i in range(self.tree_widget.topLevelItemCount()):
-            item = self.tree_widget.topLevelItem(i)
-            self.filter_tree_item(item, text)
+        if validations.errors:
+            return str(next(iter(validations.errors)))
+        for serial_number, valid in validations.results.items():
+            if not valid:
+                return str(serial_number)
+        return None
+
+    def commit_assembly(self, parent_serial: str, list_of_children: List[str], work_order: str) -> Tuple[ProductDisplayInfo, List[ProductDisplayInfo], List[str]]:
+        """
+        Runs on a worker thread: save the assembly, then look up what to display for it.
+        Must not touch any widget. Only a failed save raises; once it is saved, boards that can not be looked up
+        are shown with placeholder info and listed in the third item of the result.
+        """
+        self.product_service.add_assembly(parent_serial, list_of_children, work_order)
+
+        # TODO: Query the information from the database directly
+        # Resolve the whole assembly concurrently: one ERP round trip of wall-clock time instead of one per board
+        serial_numbers = [parent_serial] + list_of_children
+        try:
+            results = self.product_service.lookup_serial_numbers(serial_numbers)
+        except Exception as e:
+            results = {serial_number: SerialLookupResult(serial_number, False, error=str(e)) for serial_number in serial_numbers}
+        display_info: List[ProductDisplayInfo] = []
+        unavailable: List[str] = []
+        for serial_number in serial_numbers:
+            info = results[serial_number].info
+            if info is None:
+                unavailable.append(f"{serial_number}: {results[serial_number].error}")
+                info = ProductDisplayInfo(description="Display info unavailable", part_number="", revision="", serial_number=serial_number)
+            display_info.append(info)
+        return display_info[0], display_info[1:], unavailable
+
+    def show_assembly(self, assembly_info: Tuple[ProductDisplayInfo, List[ProductDisplayInfo], List[str]]) -> None:
+        """
+        Runs on the GUI thread once commit_assembly has finished. The assembly is saved even if some of its
+        display info is missing, so that is only a warning: rescanning it would write it twice.
+        """
+        product_info, children_info, unavailable = assembly_info
+
+        # Add the assembly as the first row and expand only that row
+        parent_index = self.tree_model.add_assembly(product_info, children_info)
+        self.tree_view.expand(parent_index)
             
-    def filter_tree_item(self, item, text):
+        self.primary_assembly_count += 1
+        self.counter_label.setText(f"Primary Assemblies Scanned: {self.primary_assembly_count}")
+        if unavailable:
+            self.error_label.setText(f"Assembly {product_info.serial_number} saved, but display info is unavailable for " + "; ".join(unavailable))
+
+    def show_commit_error(self, error: Exception) -> None:
         """
-        Recursively filter tree items.
+        Runs on the GUI thread when commit_assembly has failed. Stops the scan loop and tells the operator right away.
+        """
+        self.commit_error = str(error)
+        self.error_label.setText(f"Assembly commit failed: {error}")
+        QMessageBox.critical(self, "Assembly commit failed", f"Assembly commit failed: {error}\n\nScanning has stopped.")
+
+    def update_backlog(self) -> None:
+        pending = self.product_service.pending_writes()
+        rejected = self.product_service.rejected_writes()
+        # Rejected assemblies wait in the journal for someone to fix them: python scan_journal.py parked scan_journal.db
+        self.backlog_label.setText(f"Pending uploads: {pending}" + (f" ({rejected} rejected by the database)" if rejected else ""))
+        self.backlog_label.setStyleSheet("color: red;" if pending else "")
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        # Do not drop assemblies that are still being written
+        self.commit_pool.waitForDone()
+        super().closeEvent(event)
+
+    def reset_column_widths(self) -> None:
+        self.column_widths = [0] * self.tree_model.columnCount()
+
+    def index_nodes(self, first: int, last: int) -> None:
+        """
+        Widen columns for new tree model nodes if needed.
+        Only the new rows are measured, never the whole tree.
+        """
+        font_metrics = self.tree_view.fontMetrics()
+        indentation = self.tree_view.indentation()
+        padding = 2 * font_metrics.averageCharWidth()
+        widths = list(self.column_widths)
+        for node in range(first, last + 1):
+            depth = 0
+            parent_node = self.tree_model.parent_node(node)
+            while parent_node != -1:
+                depth += 1
+                parent_node = self.tree_model.parent_node(parent_node)
+            widths[0] = max(widths[0], font_metrics.horizontalAdvance(self.tree_model.text(node, 0)) + (depth + 1) * indentation + padding)
+            for column in range(1, len(widths)):
+                widths[column] = max(widths[column], font_metrics.horizontalAdvance(self.tree_model.text(node, column)) + padding)
+
+        header = self.tree_view.header()
+        for column, width in enumerate(widths):
+            if width > self.column_widths[column]:
+                header.resizeSection(column, width)
+        self.column_widths = widths
+
+    def schedule_filter(self, text: str) -> None:
+        """
+        Debounce keystrokes: restart the timer on every change.
+        """
+        self.filter_timer.start()
+
+    def filter_tree(self) -> None:
+        """
+        Filter the tree items based on the search text.
+        A row stays visible if it matches or if any of its descendants match. The model does the filtering,
+        and rows added later are filtered as they arrive.
         """
-        match = text.lower() in item.text(0).lower()
-        for i in range(item.childCount()):
-            child = item.child(i)
-            child_match = self.filter_tree_item(child, text)
-            match = match or child_match
-        item.setHidden(not match)
-        return match
\ No newline at end of file
+        self.tree_model.set_filter_text(self.search_bar.text())
@@ -0,0 +1,86 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QEventLoop, pyqtSignal, pyqtSlot
+from typing import Any, Callable, Dict, Hashable
+
+
+class WorkerSignals(QObject):
+    """
+    Signals emitted by a Worker. The object lives on the thread that created the Worker (the GUI thread),
+    so connected slots run there and can safely touch widgets.
+    """
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    def __init__(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """
+        Run fn(*args, **kwargs) on a QThreadPool thread.
+        :param fn: the blocking call to run, e.g. an ERP lookup or a database commit
+        """
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    @pyqtSlot()
+    def run(self) -> None:
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(e)
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class TaskGroup(QObject):
+    """
+    A set of keyed background tasks. Results are collected on the GUI thread as they complete,
+    and wait() keeps the event loop running until every task is done.
+    """
+    all_done = pyqtSignal()
+
+    def __init__(self, thread_pool: QThreadPool, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._thread_pool = thread_pool
+        self._pending = 0
+        self.results: Dict[Hashable, Any] = {}
+        self.errors: Dict[Hashable, Exception] = {}
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Worker:
+        worker = Worker(fn, *args, **kwargs)
+        worker.signals.result.connect(lambda result: self.results.__setitem__(key, result))
+        worker.signals.error.connect(lambda error: self.errors.__setitem__(key, error))
+        worker.signals.finished.connect(self._on_finished)
+        self._pending += 1
+        self._thread_pool.start(worker)
+        return worker
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def wait(self) -> None:
+        if self._pending == 0:
+            return
+        loop = QEventLoop()
+        self.all_done.connect(loop.quit)
+        loop.exec_()
+        self.all_done.disconnect(loop.quit)
+
+    def delete_when_done(self) -> None:
+        """
+        Schedule deleteLater() for when the last task has finished, right away if none is running.
+        """
+        if self._pending == 0:
+            self.deleteLater()
+        else:
+            self.all_done.connect(self.deleteLater)
+
+    def _on_finished(self) -> None:
+        self._pending -= 1
+        if self._pending == 0:
+            self.all_done.emit()